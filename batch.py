@@ -0,0 +1,213 @@
+#!/usr/bin/python
+"""
+Batch mode of the scripts; renders publication lists of many research groups
+(specified in the manifest file) from one, shared, harvest of citations.
+
+Usage: python batch.py [manifest_file]
+"""
+
+import json
+import os
+import sys
+from io import open
+from multiprocessing.pool import ThreadPool
+
+from configuration import get_citation_file_name
+from configuration import get_optional
+from configuration import read_config
+from parse_bibtex import clean_up_html
+from parse_bibtex import combine_citation_files
+from parse_bibtex import find_duplicate_entries
+from parse_bibtex import group_entries_by_year
+from parse_bibtex import parse_mixed_source
+from parse_bibtex import read_bibtex_entries
+from parse_bibtex import remove_nonbibtex_duplicates
+from parse_bibtex import render_bibtex_years
+
+batch_section = "batch"
+
+
+def read_groups(manifest):
+    """
+    Reads the groups specified in the manifest. Each section, apart from [batch], represents a single group
+    and may specify "ids_to_check", "people_to_check" and "scholar_ids" of its members
+    (with the same syntax as in config.ini) and its "output_directory".
+
+    :param manifest: object representing the manifest file
+    :return: list of dicts describing each group
+    """
+    working_directory = get_optional(manifest, batch_section, "working_directory", "batch")
+
+    groups = list()
+    for group_name in manifest.sections():
+        if group_name == batch_section:
+            continue
+
+        groups.append({
+            "name": group_name,
+            "orcid": json.loads(get_optional(manifest, group_name, "ids_to_check", "[]")),
+            "pubmed": json.loads(get_optional(manifest, group_name, "people_to_check", "[]")),
+            "gscholar": json.loads(get_optional(manifest, group_name, "scholar_ids", "[]")),
+            "output_directory": get_optional(manifest, group_name, "output_directory",
+                                             os.path.join(working_directory, "output", "".join(group_name.split()))),
+            "tmp_directory": os.path.join(working_directory, "tmp", "".join(group_name.split()))
+        })
+
+    return groups
+
+
+def merge_people(groups, source):
+    """
+    Merges people from all the groups so that each of them would only be queried once
+
+    :param groups: list of dicts describing each group
+    :param source: "orcid", "pubmed" or "gscholar"
+    :return: list of unique people, in the same format as in config.ini
+    """
+    people = list()
+    for group in groups:
+        for person in group[source]:
+            if person not in people:
+                people.append(person)
+
+    return people
+
+
+def get_group_citation_files(group):
+    """
+    :param group: dict describing the group
+    :return: set of names of the citation files of the group members
+    """
+    citation_files = set()
+    for keyval in group["orcid"]:
+        for person in keyval:
+            citation_files.add(get_citation_file_name(person, "ORCID"))
+    for person in group["pubmed"]:
+        citation_files.add(get_citation_file_name(person, "Pubmed"))
+    for keyval in group["gscholar"]:
+        for person in keyval:
+            citation_files.add(get_citation_file_name(person, "GSCHOLAR"))
+
+    return citation_files
+
+
+def harvest_citations(config, groups, citations_directory):
+    """
+    Gets citations of all the people from all the groups, each person is queried only once
+
+    :param config: object representing the configuration file specifying parameters of the job
+    :param groups: list of dicts describing each group
+    :param citations_directory: directory in which the citation files are saved
+    """
+    if not os.path.exists(citations_directory):
+        os.makedirs(citations_directory)
+
+    if config.get("orcid", "DO_ORCID") == "True":
+        from orcid import get_orcid_citations
+        config.set("orcid", "ids_to_check", json.dumps(merge_people(groups, "orcid")))
+        get_orcid_citations(config, citations_directory)
+
+    if config.get("pubmed", "DO_PUBMED") == "True":
+        from pubmed import get_pubmed_citations
+        config.set("pubmed", "people_to_check", json.dumps(merge_people(groups, "pubmed")))
+        get_pubmed_citations(config, citations_directory)
+
+    if config.get("gscholar", "DO_GSCHOLAR") == "True":
+        from gscholar import get_gscholar_citations
+        config.set("gscholar", "scholar_ids", json.dumps(merge_people(groups, "gscholar")))
+        get_gscholar_citations(config, citations_directory)
+
+
+def write_group_nonbibtex_citations(citation_files, citations_directory, combined_nonbibtex_file):
+    """
+    Collects nonbibtex citations of the group members (only ORCID may contain them)
+
+    :param citation_files: names of the citation files of the group members
+    :param citations_directory: directory containing the citation files
+    :param combined_nonbibtex_file: file the citations are written to
+    """
+    with open(combined_nonbibtex_file, "w", encoding='utf-8') as combined_nonbibtex:
+        for file in sorted(citation_files):
+            if file.endswith("ORCID.bib") and os.path.exists(os.path.join(citations_directory, file)):
+                (_, nonbibtex_citations) = parse_mixed_source(os.path.join(citations_directory, file))
+                for nonbibtex_citation in nonbibtex_citations:
+                    combined_nonbibtex.write(nonbibtex_citation + "\n")
+
+    remove_nonbibtex_duplicates(combined_nonbibtex_file)
+
+
+def run_batch(manifest_file):
+    """
+    Runs the whole job for all the groups specified in the manifest file.
+    Citations of each person are obtained only once and are then combined and parsed together,
+    afterwards html files of each group are generated (in parallel) in their own output directories.
+
+    :param manifest_file: location of the manifest file
+    """
+    manifest = read_config(manifest_file)
+    config = read_config(get_optional(manifest, batch_section, "config_file", "config.ini"))
+    working_directory = get_optional(manifest, batch_section, "working_directory", "batch")
+    workers = int(get_optional(manifest, batch_section, "workers", "4"))
+
+    groups = read_groups(manifest)
+    if not groups:
+        print("There are no groups specified in " + manifest_file)
+        return
+
+    citations_directory = os.path.join(working_directory, "citations")
+    combined_directory = os.path.join(working_directory, "combined")
+    combined_bibtex_file = os.path.join(combined_directory, "combined_bibtex.bib")
+    combined_nonbibtex_file = os.path.join(combined_directory, "combined_nonbibtex_citations.txt")
+
+    harvest_citations(config, groups, citations_directory)
+
+    if config.get("bibtex", "PARSE_OUTPUT") != "True":
+        return
+
+    if not os.path.exists(combined_directory):
+        os.makedirs(combined_directory)
+
+    try:
+        citation_file_ranges = combine_citation_files(combined_bibtex_file, combined_nonbibtex_file,
+                                                       citations_directory)
+    except IOError:
+        print("There are no citations files to combine")
+        return
+
+    bibtex_index = read_bibtex_entries(combined_bibtex_file, citation_file_ranges)
+    citation_style_file = config.get("bibtex", "citation_style_file")
+
+    def render_group(group):
+        print("[Batch] Generating publication list of " + group["name"])
+        output_directory = group["output_directory"]
+        if not os.path.exists(output_directory):
+            os.makedirs(output_directory)
+
+        group_citation_files = get_group_citation_files(group)
+        group_records = [record for record in bibtex_index.records if record.source in group_citation_files]
+
+        # duplicates are looked for only among the group entries, otherwise an entry could be excluded in favour of
+        # the same publication of a person outside of the group
+        entries_to_exclude = find_duplicate_entries(group_records)
+
+        write_group_nonbibtex_citations(group_citation_files, citations_directory,
+                                        os.path.join(output_directory, "combined_nonbibtex_citations.txt"))
+
+        entries_by_year = group_entries_by_year(group_records, entries_to_exclude)
+        output_files = render_bibtex_years(entries_by_year, bibtex_index, output_directory, citation_style_file,
+                                           group["tmp_directory"])
+
+        # html files left by the previous runs must not be cleaned up again
+        clean_up_html(output_directory, ["combined_nonbibtex_citations.txt"] + output_files)
+
+    pool = ThreadPool(workers)  # work is done by bibtex2html processes, so threads are sufficient
+    try:
+        pool.map(render_group, groups)
+    finally:
+        pool.close()
+        pool.join()
+        bibtex_index.close()
+
+
+if __name__ == '__main__':
+    run_batch(sys.argv[1] if len(sys.argv) > 1 else "groups.ini")
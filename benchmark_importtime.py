@@ -0,0 +1,130 @@
+#!/usr/bin/python
+"""
+Measures how long it takes to import the scripts (using python's -X importtime option, python 3.7+)
+and checks that the start of main.py, i.e. importing it along with the modules of the enabled stages,
+stays within the given time budget when querying a single source (ORCID or PubMed alone),
+and that no run loads heavy dependencies of the stages it does not use.
+
+Usage: python benchmark_importtime.py [budget_in_ms] [config_file]
+"""
+
+import configparser
+import re
+import subprocess
+import sys
+
+from main import get_stage_modules
+
+default_budget = 80  # in ms
+runs = 10  # each start is measured several times and the fastest one is taken, to reduce the noise
+
+# heavy dependencies along with the modules which are allowed to load them; pybtex is only used by the tests
+heavy_modules = {"selenium": ["gscholar"],
+                 "lxml": ["orcid", "pubmed"],
+                 "asyncio": ["engine"],
+                 "pybtex": []}
+
+stage_modules = ["orcid", "pubmed", "gscholar", "parse_bibtex", "engine"]
+
+# sources enabled in each of the measured runs of main.py (parsing of the outputs is always enabled);
+# runs querying a single source, e.g. the scheduled ones, have to start within the budget
+scenarios = [("ORCID", ["orcid"], True),
+             ("PubMed", ["pubmed"], True),
+             ("ORCID + PubMed", ["orcid", "pubmed"], False),
+             ("all sources", ["orcid", "pubmed", "gscholar"], False)]
+
+source_options = {"orcid": "DO_ORCID", "pubmed": "DO_PUBMED", "gscholar": "DO_GSCHOLAR"}
+
+
+def measure_imports(modules):
+    """
+    Imports the modules, one after another, in a fresh python interpreter
+
+    :param modules: names of the modules to import
+    :return: tuple with total import time of the modules (in ms, fastest of the runs) and dict of import times (in ms)
+        of all modules imported along with them, or None if they could not be imported
+    """
+    total_time = None
+    for _ in range(runs):
+        process = subprocess.Popen([sys.executable, "-X", "importtime", "-c", "; ".join("import " + module
+                                                                                      for module in modules)],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        (_, importtime_output) = process.communicate()
+        if process.returncode != 0:
+            return None
+
+        # each line is in the form of: "import time: self [us] | cumulative | imported package";
+        # modules imported directly have the least indentation, the others are included in their cumulative times
+        import_times = dict()
+        run_time = 0.0
+        for line in importtime_output.splitlines():
+            match = re.match(r'import time:\s*(\d+) \|\s*(\d+) \|( *)(\S+)', line)
+            if match:
+                import_times[match.group(4)] = int(match.group(2)) / 1000.0
+                if len(match.group(3)) == 1 and match.group(4) in modules:
+                    run_time += int(match.group(2)) / 1000.0
+
+        if total_time is None or run_time < total_time:
+            total_time = run_time
+
+    return total_time, import_times
+
+
+def get_scenario_config(config_file, sources):
+    """
+    :param config_file: location of the configuration file the run is based on
+    :param sources: sources enabled in the run
+    :return: object representing the configuration file of the run
+    """
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    for source, option in source_options.items():
+        config.set(source, option, str(source in sources))
+    config.set("bibtex", "PARSE_OUTPUT", "True")
+    return config
+
+
+def main():
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else default_budget
+    config_file = sys.argv[2] if len(sys.argv) > 2 else "config.ini"
+
+    for module in stage_modules:
+        result = measure_imports([module])
+        if result is None:
+            print("%-16s could not be imported (missing dependencies?)" % module)
+        else:
+            print("%-16s %8.1f ms" % (module, result[0]))
+
+    is_within_budget = True
+
+    # start of main.py consists of importing it and then the modules of the enabled stages
+    print("")
+    for (scenario, sources, is_budgeted) in scenarios:
+        modules = ["main"] + get_stage_modules(get_scenario_config(config_file, sources))
+        result = measure_imports(modules)
+        if result is None:
+            print("%-16s could not be imported (missing dependencies?)" % scenario)
+            continue
+
+        (start_time, import_times) = result
+        print("%-16s %8.1f ms %s(%s)" % (scenario, start_time, "(budget: %.1f ms) " % budget if is_budgeted else "",
+                                         ", ".join(modules)))
+
+        if is_budgeted and start_time > budget:
+            print("Start of main.py querying " + scenario + " takes longer than the budget")
+            is_within_budget = False
+
+        for module in sorted(import_times):
+            heavy_module = module.split(".")[0]
+            if module == heavy_module and heavy_module in heavy_modules and \
+                    not any(stage in modules for stage in heavy_modules[heavy_module]):
+                print("Start of main.py querying " + scenario + " imports " + module +
+                      ", even though none of the stages which need it is enabled")
+                is_within_budget = False
+
+    if not is_within_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
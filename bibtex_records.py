@@ -0,0 +1,287 @@
+import bisect
+import mmap
+import re
+from io import open
+
+# try to import modules for python3, if failed, fallback to python2
+try:
+    from sys import intern
+except ImportError:
+    def intern(value):
+        return value  # python 2 can only intern byte strings
+
+entry_start_regex = re.compile(br'@[ \t]*([A-Za-z]+)[ \t\r\n]*[{(]')
+field_name_regex = re.compile(r'[ \t\r\n,]*([^ \t\r\n=,{}()"#]+)[ \t\r\n]*=[ \t\r\n]*')
+bare_value_regex = re.compile(r'[^ \t\r\n,#})]+')
+concatenation_regex = re.compile(r'[ \t\r\n]*#[ \t\r\n]*')
+brace_regex = re.compile(r'[{}]')
+
+
+class BibtexRecord(object):
+    """
+    Lightweight representation of a bibtex entry, holding only what is needed to group the entries
+    and to remove the duplicates. The entry itself is kept as bytes of the bibtex data it was read from.
+    """
+
+    __slots__ = ("key", "year", "title_hash", "source", "offset", "length")
+
+    def __init__(self, key, year, title_hash, source, offset, length):
+        """
+        :param key: citation key of the entry
+        :param year: publication year ('none' if not specified)
+        :param title_hash: hash of the normalized title, None if the entry has no title
+        :param source: name of the citation file the entry came from (None if not known)
+        :param offset: offset (in bytes) of the entry in the bibtex data
+        :param length: length (in bytes) of the entry
+        """
+        self.key = key
+        self.year = year
+        self.title_hash = title_hash
+        self.source = source
+        self.offset = offset
+        self.length = length
+
+
+def find_closing_brace(text, start):
+    """
+    :param text: text to search
+    :param start: position just after the opening brace
+    :return: position of the matching closing brace or -1 if it is not there
+    """
+    depth = 1
+    for brace_match in brace_regex.finditer(text, start):
+        if brace_match.group(0) == "{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return brace_match.start()
+    return -1
+
+
+def find_entry_end(bibtex_data, start, opening):
+    """
+    :param bibtex_data: bytes of the bibtex data
+    :param start: position just after the opening brace of the entry
+    :param opening: b"{" or b"(" depending on which one is used to delimit the entry
+    :return: position just after the end of the entry
+    """
+    closing = b"}" if opening == b"{" else b")"
+    depth = 1
+    idx = start
+    while True:
+        next_opening = bibtex_data.find(opening, idx)
+        next_closing = bibtex_data.find(closing, idx)
+        if next_closing == -1:
+            return len(bibtex_data)  # unbalanced braces, the entry lasts until the end of the data
+        if next_opening != -1 and next_opening < next_closing:
+            depth += 1
+            idx = next_opening + 1
+        else:
+            depth -= 1
+            idx = next_closing + 1
+            if depth == 0:
+                return idx
+
+
+def read_fields(fields_text, string_macros):
+    """
+    Reads fields of the entry, values are cleaned up similarly to how pybtex does it,
+    i.e. delimiting braces or quotes are removed, macros are substituted and whitespace is collapsed
+
+    :param fields_text: text of the entry after its citation key
+    :param string_macros: dict of values of @string macros defined so far
+    :return: dict of values of the fields, names of the fields are lowercase
+    """
+    fields = dict()
+    position = 0
+    while True:
+        name_match = field_name_regex.match(fields_text, position)
+        if not name_match:
+            return fields
+        position = name_match.end()
+
+        value_parts = list()
+        while position < len(fields_text):
+            if fields_text[position] == "{":
+                end = find_closing_brace(fields_text, position + 1)
+                if end == -1:
+                    return fields
+                value_parts.append(fields_text[position + 1:end])
+                position = end + 1
+            elif fields_text[position] == '"':
+                end = position + 1
+                depth = 0
+                while end < len(fields_text) and (fields_text[end] != '"' or depth > 0):
+                    if fields_text[end] == "{":
+                        depth += 1
+                    elif fields_text[end] == "}":
+                        depth -= 1
+                    end += 1
+                value_parts.append(fields_text[position + 1:end])
+                position = end + 1
+            else:
+                value_match = bare_value_regex.match(fields_text, position)
+                if not value_match:
+                    break
+                value = value_match.group(0)
+                value_parts.append(value if value.isdigit() else string_macros.get(value.lower(), ""))
+                position = value_match.end()
+
+            concatenation_match = concatenation_regex.match(fields_text, position)
+            if not concatenation_match:
+                break
+            position = concatenation_match.end()
+
+        fields[name_match.group(1).lower()] = " ".join("".join(value_parts).split())
+
+
+def normalize_title(title):
+    """
+    :param title: title of the entry
+    :return: title without enclosing brackets, i.e. {{someTitle}}, and with collapsed whitespace
+    """
+    title = " ".join(title.split())
+    while title and title[0] == '{' and title[-1] == '}':  # some titles had double brackets, i.e. {{someTitle}}
+        title = title[1:-1]
+    return title
+
+
+def read_bibtex_records(bibtex_data, source_ranges=None, definitions=None):
+    """
+    Reads records of all the entries from the bibtex data without parsing the entries in full
+
+    :param bibtex_data: bytes of the bibtex data (or memory-mapped file)
+    :param source_ranges: dict of (start, end) byte ranges of the data taken by each citation file
+    :param definitions: if specified, (offset, length) of each @string and @preamble entry are appended to it
+    :return: list of records in order of appearance
+    """
+    sources = sorted((start, end, citation_file) for citation_file, (start, end) in (source_ranges or dict()).items())
+    source_starts = [start for (start, _, _) in sources]
+
+    records = list()
+    string_macros = dict()
+    position = 0
+    while True:
+        start_match = entry_start_regex.search(bibtex_data, position)
+        if not start_match:
+            return records
+
+        entry_type = start_match.group(1).lower().decode("ascii")
+        if entry_type == "comment":
+            # same as bibtex (and pybtex), only the command itself is skipped, the text after it is read as usual
+            position = start_match.end()
+            continue
+
+        offset = start_match.start()
+        end = find_entry_end(bibtex_data, start_match.end(), bibtex_data[start_match.end() - 1:start_match.end()])
+        position = end
+
+        if entry_type in ("string", "preamble") and definitions is not None:
+            definitions.append((offset, end - offset))
+
+        if entry_type == "preamble":
+            continue
+
+        entry_text = bibtex_data[start_match.end():end - 1].decode("utf-8")
+        if entry_type == "string":
+            string_macros.update(read_fields(entry_text, string_macros))
+            continue
+
+        (key, _, fields_text) = entry_text.partition(",")
+        key = key.strip()
+        fields = read_fields(fields_text, string_macros)
+
+        year = fields.get("year", "").strip() or "none"
+        title_hash = hash(normalize_title(fields["title"])) if "title" in fields else None
+        source_idx = bisect.bisect_right(source_starts, offset) - 1
+        source = sources[source_idx][2] if source_idx >= 0 and offset < sources[source_idx][1] else None
+        records.append(BibtexRecord(key, intern(year), title_hash, source, offset, end - offset))
+
+
+class BibtexEntries(object):
+    """
+    Entries of bibtex data along with their records; the entries are sliced from the data when needed
+    """
+
+    def __init__(self, bibtex_data, records, definitions):
+        """
+        :param bibtex_data: bytes of the bibtex data (or memory-mapped file)
+        :param records: records of the entries, in order of appearance
+        :param definitions: (offset, length) of each @string and @preamble entry
+        """
+        self.data = bibtex_data
+        self.records = records
+        self.definitions = definitions
+
+        self.records_by_key = dict((record.key, record) for record in self.records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Releases the data, nothing needs to be done if it is held in memory
+        """
+        pass
+
+    def get_entry_bytes(self, citation_key):
+        """
+        :param citation_key: citation key of the entry
+        :return: bibtex text of the entry as bytes
+        """
+        record = self.records_by_key[citation_key]
+        return self.data[record.offset:record.offset + record.length]
+
+    def get_definitions_bytes(self):
+        """
+        :return: bibtex text of all @string and @preamble entries as bytes, entries may depend on them
+        """
+        return b"\n".join(self.data[offset:offset + length] for (offset, length) in self.definitions)
+
+    def write_entries(self, citation_keys, bibtex_file):
+        """
+        Writes the given entries (along with @string and @preamble entries they may depend on) to a separate file
+
+        :param citation_keys: citation keys of the entries
+        :param bibtex_file: location of the file
+        """
+        with open(bibtex_file, "wb") as output_file:
+            if self.definitions:
+                output_file.write(self.get_definitions_bytes() + b"\n\n")
+            for citation_key in citation_keys:
+                output_file.write(self.get_entry_bytes(citation_key) + b"\n\n")
+
+
+class BibtexIndex(BibtexEntries):
+    """
+    Index of the entries of a bibtex file, built in a single pass over the memory-mapped file.
+    Entries are then sliced from the mapping when needed, so the file is never loaded (or rewritten) as a whole.
+    """
+
+    def __init__(self, bibtex_file, source_ranges=None):
+        """
+        :param bibtex_file: location of the bibtex file
+        :param source_ranges: dict of (start, end) byte ranges of the file taken by each citation file
+        """
+        self.bibtex_file = bibtex_file
+        self.file = open(bibtex_file, "rb")
+        try:
+            bibtex_data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            bibtex_data = b""  # empty files cannot be mapped
+
+        definitions = list()
+        BibtexEntries.__init__(self, bibtex_data, read_bibtex_records(bibtex_data, source_ranges, definitions),
+                               definitions)
+
+    def close(self):
+        """
+        Unmaps and closes the file; it has to be done before the file is rewritten
+        """
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
@@ -0,0 +1,49 @@
+"""
+Helpers for reading the configuration files, shared by the different modes of the scripts
+"""
+
+# try to import modules for python3, if failed, fallback to python2
+try:
+    import configparser
+except ImportError:
+    import ConfigParser
+
+
+def read_config(config_file):
+    """
+    Reads the configuration file (either the main one or the manifest of groups)
+
+    :param config_file: location of the file
+    :return: object representing the configuration file
+    """
+    try:
+        config = configparser.ConfigParser()
+    except NameError:
+        config = ConfigParser.ConfigParser()
+
+    config.read(config_file)
+    return config
+
+
+def get_optional(config, section, option, default):
+    """
+    Gets value of an option which does not have to be present in the configuration file
+
+    :param config: object representing the configuration file
+    :param section: section of the option
+    :param option: name of the option
+    :param default: value returned if the option is not specified
+    :return: value of the option
+    """
+    if config.has_option(section, option):
+        return config.get(section, option)
+    return default
+
+
+def get_citation_file_name(person, source):
+    """
+    :param person: name of the person
+    :param source: source of the citations, i.e. "ORCID", "Pubmed" or "GSCHOLAR"
+    :return: name of the file the citations of the person from the given source are saved to
+    """
+    return "".join(person.split()) + "_from" + source + ".bib"
@@ -0,0 +1,144 @@
+import socket
+import threading
+import time
+
+# try to import modules for python3, if failed, fallback to python2
+try:
+    from http.client import HTTPConnection
+    from http.client import HTTPException
+    from http.client import HTTPSConnection
+    from urllib.error import HTTPError
+    from urllib.parse import urljoin
+    from urllib.parse import urlsplit
+    from urllib.request import getproxies
+    from urllib.request import proxy_bypass
+    from urllib.request import urlopen
+except ImportError:
+    from httplib import HTTPConnection
+    from httplib import HTTPException
+    from httplib import HTTPSConnection
+    from urllib import getproxies
+    from urllib import proxy_bypass
+    from urllib2 import HTTPError
+    from urllib2 import urlopen
+    from urlparse import urljoin
+    from urlparse import urlsplit
+
+max_redirects = 5
+
+# each thread keeps its own connections, as they cannot be shared between threads
+local_connections = threading.local()
+
+
+class RateLimiter(object):
+    """
+    Limits how many requests can be sent per second; it can be shared by any number of threads
+    """
+
+    def __init__(self, rate):
+        """
+        :param rate: maximum number of requests sent per second
+        """
+        self.interval = 1.0 / rate
+        self.next_request = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        Waits until the next request can be sent without exceeding the rate
+        """
+        with self.lock:  # the other threads wait for their turn in the meantime
+            time_to_wait = self.next_request - time.time()
+            if time_to_wait > 0:
+                time.sleep(time_to_wait)
+            self.next_request = time.time() + self.interval
+
+
+def get_connection(scheme, host):
+    """
+    Gets already opened connection to the host or opens a new one
+
+    :param scheme: "http" or "https"
+    :param host: host (and possibly port) to connect to
+    :return: the connection
+    """
+    if not hasattr(local_connections, "pool"):
+        local_connections.pool = dict()
+
+    if (scheme, host) not in local_connections.pool:
+        if scheme == "https":
+            local_connections.pool[(scheme, host)] = HTTPSConnection(host, timeout=60)
+        else:
+            local_connections.pool[(scheme, host)] = HTTPConnection(host, timeout=60)
+
+    return local_connections.pool[(scheme, host)]
+
+
+def close_connection(scheme, host):
+    """
+    Closes the connection to the host (if there is one), so that the next request would open a new one
+
+    :param scheme: "http" or "https"
+    :param host: host (and possibly port) the connection is to
+    """
+    if hasattr(local_connections, "pool") and (scheme, host) in local_connections.pool:
+        local_connections.pool.pop((scheme, host)).close()
+
+
+def is_proxied(url):
+    """
+    :param url: url to get
+    :return: True if the request should go through a proxy (as specified by http_proxy, https_proxy, etc.)
+    """
+    parsed_url = urlsplit(url)
+    return parsed_url.scheme in getproxies() and not proxy_bypass(parsed_url.hostname or "")
+
+
+def read_url(url, rate_limiter=None):
+    """
+    Replacement for urlopen(url).read() which keeps the connection to the host open,
+    so that subsequent requests to it do not have to connect (and negotiate TLS) again.
+    If a proxy is configured for the url, urlopen() itself is used, so that the requests go through the proxy
+
+    :param url: url to get
+    :param rate_limiter: if specified, every request (including redirects and retries) waits for its turn
+    :return: body of the response
+    """
+    if is_proxied(url):
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        return urlopen(url).read()
+
+    for _ in range(max_redirects + 1):
+        parsed_url = urlsplit(url)
+        path = parsed_url.path or "/"
+        if parsed_url.query:
+            path += "?" + parsed_url.query
+
+        # the server might have closed the connection which was kept open, in that case try once more with a new one
+        try:
+            if rate_limiter is not None:
+                rate_limiter.wait()
+            connection = get_connection(parsed_url.scheme, parsed_url.netloc)
+            connection.request("GET", path)
+            response = connection.getresponse()
+        except (HTTPException, socket.error):
+            close_connection(parsed_url.scheme, parsed_url.netloc)
+            if rate_limiter is not None:
+                rate_limiter.wait()
+            connection = get_connection(parsed_url.scheme, parsed_url.netloc)
+            connection.request("GET", path)
+            response = connection.getresponse()
+
+        data = response.read()  # the whole response must be read before the connection can be reused
+
+        if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+            url = urljoin(url, response.getheader("Location"))
+            continue
+
+        if response.status >= 400:
+            raise HTTPError(url, response.status, response.reason, response.msg, None)
+
+        return data
+
+    raise HTTPError(url, 310, "Too many redirects", None, None)
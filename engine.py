@@ -0,0 +1,311 @@
+"""
+Queries all the sources (ORCID, PubMed and Google Scholar) concurrently, with limited number of people
+being queried at the same time and limited rate of starting the queries, separately for each source.
+Citation files are combined as soon as they are obtained (and all the files preceding them in the combined file are),
+so the whole job takes roughly as long as the slowest source.
+
+Requires python 3.5+; the fetching itself is done by the blocking functions of orcid.py, pubmed.py and gscholar.py
+run in executors.
+"""
+
+import asyncio
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import open
+
+from configuration import get_citation_file_name
+from configuration import get_optional
+from parse_bibtex import append_citation_file
+from parse_bibtex import get_combined_files
+from parse_bibtex import order_citation_files
+from parse_bibtex import render_combined_files
+from parse_bibtex import unique_cite_keys
+
+engine_section = "engine"
+
+# ORCID public API allows 24 requests per second
+default_orcid_concurrency = 4
+default_orcid_rate = 8
+
+# each person requires two requests; pubmed.py keeps them within the NCBI limit (3 requests per second without an API key)
+# regardless of how many people are queried at the same time
+default_pubmed_concurrency = 2
+default_pubmed_rate = 1.5
+
+
+class Source(object):
+    """
+    Limits how many people can be queried from a single source at the same time and how often a new query can start
+    """
+
+    def __init__(self, name, concurrency, rate, executor):
+        """
+        :param name: name of the source
+        :param concurrency: maximum number of people being queried at the same time
+        :param rate: maximum number of queries started per second (0 for no limit)
+        :param executor: executor in which the queries are run
+        """
+        self.name = name
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.next_start = 0.0
+        self.start_lock = asyncio.Lock()
+        self.executor = executor
+
+    async def wait_for_turn(self):
+        """
+        Waits until the next query can start without exceeding the rate
+        """
+        loop = asyncio.get_event_loop()
+        async with self.start_lock:
+            time_to_wait = self.next_start - loop.time()
+            if time_to_wait > 0:
+                await asyncio.sleep(time_to_wait)
+            self.next_start = loop.time() + self.interval
+
+    async def run(self, function, *args):
+        """
+        Runs the blocking function in the executor, once the limits of the source allow it
+
+        :param function: function querying the source
+        :param args: arguments of the function
+        :return: result of the function
+        """
+        async with self.semaphore:
+            await self.wait_for_turn()
+            return await asyncio.get_event_loop().run_in_executor(self.executor, functools.partial(function, *args))
+
+
+def get_concurrency(config, name, default_concurrency):
+    """
+    :param config: object representing the configuration file specifying parameters of the job
+    :param name: name of the source, as used in the [engine] section of the configuration file
+    :param default_concurrency: number of people queried at the same time if not specified in the configuration file
+    :return: maximum number of people queried from the source at the same time
+    """
+    return int(get_optional(config, engine_section, name + "_concurrency", str(default_concurrency)))
+
+
+def get_source(config, name, default_concurrency, default_rate, executor):
+    """
+    :param config: object representing the configuration file specifying parameters of the job
+    :param name: name of the source, as used in the [engine] section of the configuration file
+    :param default_concurrency: number of people queried at the same time if not specified in the configuration file
+    :param default_rate: number of queries started per second if not specified in the configuration file
+    :param executor: executor in which the queries are run
+    :return: the source
+    """
+    rate = float(get_optional(config, engine_section, name + "_rate", str(default_rate)))
+    return Source(name, get_concurrency(config, name, default_concurrency), rate, executor)
+
+
+async def get_person_citations(source, citation_file, completed_files, function, *args):
+    """
+    Queries a single person and passes their citation file on to be combined; it is passed on even if the query failed,
+    so that the citations from the previous run (if there are any) are still combined in the right place
+
+    :param source: the source being queried
+    :param citation_file: name of the citation file the function saves the citations to
+    :param completed_files: queue of citation files ready to be combined (or None)
+    :param function: function querying the source
+    :param args: arguments of the function
+    :return: result of the function or None if it failed
+    """
+    try:
+        result = await source.run(function, *args)
+    except Exception as e:  # the other people and sources should still be queried
+        print("[" + source.name + "] Could not get citations: " + str(e))
+        result = None
+
+    if completed_files is not None:
+        await completed_files.put(citation_file)
+    return result
+
+
+async def combine_as_completed(completed_files, expected_files, combined_bibtex_file, combined_nonbibtex_file,
+                               citations_directory):
+    """
+    Appends the citation files to the combined files in the same order as parse_bibtex.combine_citation_files() does,
+    so that the same citation keys are suffixed and the same duplicates are kept regardless of which query finishes first.
+    Each citation file is appended as soon as it and all the files preceding it are obtained;
+    the files which are not going to be obtained in this run (i.e. from the previous ones) do not need to be waited for
+
+    :param completed_files: queue of citation files ready to be combined, None marks its end
+    :param expected_files: names of the citation files which are going to be obtained in this run
+    :param combined_bibtex_file: location of the combined bibtex file
+    :param combined_nonbibtex_file: location of the combined nonbibtex file
+    :param citations_directory: directory containing the citation files
+    :return: True if any citation file was combined, False otherwise
+    """
+    unique_cite_keys.clear()  # keys might have been collected by a previous run within the same process
+    citation_files = order_citation_files(set(os.listdir(citations_directory)) | set(expected_files))
+    obtained_files = set()
+    combined_files = list()
+
+    with open(combined_bibtex_file, "w", encoding='utf-8') as combined_bibtex:
+        with open(combined_nonbibtex_file, "w", encoding='utf-8') as combined_nonbibtex:
+            def append_obtained_files(is_finished):
+                while len(combined_files) < len(citation_files):
+                    citation_file = citation_files[len(combined_files)]
+                    if not is_finished and citation_file in expected_files and citation_file not in obtained_files:
+                        return  # the following files have to wait for this one
+
+                    if os.path.exists(os.path.join(citations_directory, citation_file)):
+                        append_citation_file(citation_file, citations_directory, combined_bibtex, combined_nonbibtex)
+                    combined_files.append(citation_file)
+
+            while True:
+                append_obtained_files(False)
+                citation_file = await completed_files.get()
+                if citation_file is None:
+                    break
+                obtained_files.add(citation_file)
+
+            # some of the expected files might have not been obtained at all, e.g. if Google Scholar stopped responding
+            append_obtained_files(True)
+
+    return any(os.path.exists(os.path.join(citations_directory, citation_file)) for citation_file in combined_files)
+
+
+async def gather_citations(config, citations_directory):
+    """
+    Queries all the enabled sources concurrently and, if the outputs are to be parsed,
+    combines the citation files as they come
+
+    :param config: object representing the configuration file specifying parameters of the job
+    :param citations_directory: directory in which the citation files are saved
+    :return: True if there are citations to generate the output from, False otherwise
+    """
+    do_parse = config.get("bibtex", "PARSE_OUTPUT") == "True"
+    completed_files = asyncio.Queue() if do_parse else None
+    expected_files = list()
+    combining = None
+
+    # ORCID and PubMed queries are mostly waiting for the responses, so they can share a pool of threads;
+    # Google Scholar uses a single browser, so it gets its own thread
+    executor = ThreadPoolExecutor(max_workers=get_concurrency(config, "orcid", default_orcid_concurrency) +
+                                  get_concurrency(config, "pubmed", default_pubmed_concurrency))
+    scholar_executor = ThreadPoolExecutor(max_workers=1)
+
+    try:
+        orcid_people = list()
+        jobs = list()
+        if config.get("orcid", "DO_ORCID") == "True":
+            from orcid import get_orcid_person_citations
+            orcid_source = get_source(config, "orcid", default_orcid_concurrency, default_orcid_rate, executor)
+            for keyval in json.loads(config.get("orcid", "ids_to_check")):
+                for person, orcid in keyval.items():
+                    citation_file = get_citation_file_name(person, "ORCID")
+                    orcid_people.append(person)
+                    expected_files.append(citation_file)
+                    jobs.append(get_person_citations(
+                        orcid_source, citation_file, completed_files, get_orcid_person_citations, config, person, orcid,
+                        citations_directory))
+
+        if config.get("pubmed", "DO_PUBMED") == "True":
+            from pubmed import get_pubmed_person_citations
+            pubmed_source = get_source(config, "pubmed", default_pubmed_concurrency, default_pubmed_rate, executor)
+            for person in json.loads(config.get("pubmed", "people_to_check")):
+                citation_file = get_citation_file_name(person, "Pubmed")
+                expected_files.append(citation_file)
+                jobs.append(get_person_citations(
+                    pubmed_source, citation_file, completed_files, get_pubmed_person_citations, config, person,
+                    citations_directory))
+
+        if config.get("gscholar", "DO_GSCHOLAR") == "True":
+            for keyval in json.loads(config.get("gscholar", "scholar_ids")):
+                for person in keyval:
+                    expected_files.append(get_citation_file_name(person, "GSCHOLAR"))
+            jobs.append(get_scholar_citations(Source("Google Scholar", 1, 0, scholar_executor), completed_files,
+                                              config, citations_directory))
+
+        if do_parse:
+            (combined_bibtex_file, combined_nonbibtex_file) = get_combined_files(config)
+            combining = asyncio.ensure_future(combine_as_completed(
+                completed_files, set(expected_files), combined_bibtex_file, combined_nonbibtex_file,
+                citations_directory))
+
+        # a failing job must not cancel the others, as the executors they run in are shut down right after
+        results = await asyncio.gather(*jobs, return_exceptions=True)
+        for (idx, result) in enumerate(results):
+            if isinstance(result, Exception):
+                print("[Engine] Could not get citations: " + str(result))
+                results[idx] = None
+    finally:
+        executor.shutdown()
+        scholar_executor.shutdown()
+
+        if combining is not None:
+            await completed_files.put(None)
+            has_citations = await combining
+
+    if orcid_people:
+        from orcid import print_unspecified_format_summary
+        print_unspecified_format_summary(dict((person, result or 0) for (person, result) in
+                                              zip(orcid_people, results)))
+
+    return has_citations if do_parse else False
+
+
+async def get_scholar_citations(source, completed_files, config, citations_directory):
+    """
+    Queries the people on Google Scholar one after another, as they share the browser
+
+    :param source: the Google Scholar source
+    :param completed_files: queue of citation files ready to be combined (or None)
+    :param config: object representing the configuration file specifying parameters of the job
+    :param citations_directory: directory in which the citation files are saved
+    """
+    try:
+        from gscholar import get_gscholar_person_citations
+        from gscholar import open_browser
+
+        browser_driver = await source.run(open_browser, config)
+    except Exception as e:  # e.g. selenium is not installed; the other sources should still be queried
+        print("[Google Scholar] Could not open the browser: " + str(e))
+        return
+
+    try:
+        for keyval in json.loads(config.get("gscholar", "scholar_ids")):
+            for person, scholar_id in keyval.items():
+                should_continue = await get_person_citations(
+                    source, get_citation_file_name(person, "GSCHOLAR"), completed_files,
+                    get_gscholar_person_citations, config, browser_driver, person, scholar_id, citations_directory)
+                if should_continue is False:
+                    return  # Google Scholar stopped responding, no point in querying anyone else
+    finally:
+        try:
+            await source.run(browser_driver.close)
+        except Exception as e:  # the citations are already obtained
+            print("[Google Scholar] Could not close the browser: " + str(e))
+
+
+def get_citations(config, citations_directory="citations"):
+    """
+    Gets citations from all the enabled sources concurrently and, if the outputs are to be parsed,
+    generates html files from them
+
+    :param config: object representing the configuration file specifying parameters of the job
+    :param citations_directory: directory in which the citation files are saved
+    """
+    if not os.path.exists(citations_directory):
+        os.makedirs(citations_directory)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        has_citations = loop.run_until_complete(gather_citations(config, citations_directory))
+    finally:
+        loop.close()
+
+    if config.get("bibtex", "PARSE_OUTPUT") != "True":
+        return
+
+    # if there are no citations files to combine, throw exception up, so that the script would not try to clean html which does and will not exist
+    if not has_citations:
+        print("There are no citations files to combine")
+        raise IOError
+
+    render_combined_files(config, *get_combined_files(config))
@@ -41,20 +41,13 @@ def move_to_element(element, browser_driver):
     time.sleep(time_to_wait / 1000.0)
 
 
-def get_gscholar_citations(config):
+def open_browser(config):
     """
-    Since Google Scholar does not have any public API and they do not like people automatically scraping their resources,
-    we need to "fool" them that the script is a real person so they would not block it.
-
-    For that reason all waiting times are randomly generated so that it would not seem too unhuman.
-
-    The script goes through profiles of each specified person and then pulls bibtex citations for all of their listed publications
+    Opens the browser specified in the configuration file
 
     :param config: object representing the configuration file specifying parameters of the job
+    :return: the browser driver
     """
-
-    scholar_ids = json.loads(config.get("gscholar", "scholar_ids"))
-
     browser_driver_name = config.get("gscholar", "browser_driver")
 
     browser_driver = None
@@ -73,105 +66,142 @@ def get_gscholar_citations(config):
         raise ValueError(
             'Incorrect Browser Driver was detected. Check if you have correct name set in the configuration file, alternatively try to reinstall the driver')
 
+    return browser_driver
+
+
+def get_gscholar_person_citations(config, browser_driver, person, scholar_id, citations_directory="citations"):
+    """
+    Pulls bibtex citations for all of the publications listed in Google Scholar profile of a single person
+
+    :param config: object representing the configuration file specifying parameters of the job
+    :param browser_driver: the browser driver (see open_browser())
+    :param person: name of the person
+    :param scholar_id: google scholar id of the person
+    :param citations_directory: directory in which the citation files are saved
+    :return: False if Google Scholar stopped responding and no more people should be queried, True otherwise
+    """
     main_window_handle = browser_driver.window_handles[0]
 
-    for keyval in scholar_ids:
-        try:
-            # this is due to the way the json is structured; each person is represented as an object with single attribute person : scholar id;
-            for person, scholar_id in keyval.items():
-                print("[Google Scholar] Getting citations for " + person)
-                citation_file_name = os.path.join("citations", "".join(person.split()) + "_fromGSCHOLAR.bib")
+    print("[Google Scholar] Getting citations for " + person)
+    citation_file_name = os.path.join(citations_directory, "".join(person.split()) + "_fromGSCHOLAR.bib")
+
+    citations_url = config.get("gscholar", "BASE_SCHOLAR_URL") + config.get("gscholar",
+                                                                            "SCHOLAR_CITATIONS_URL") + scholar_id + config.get(
+        "gscholar", "SCHOLAR_URL_POSTFIX")
+
+    browser_driver.get(citations_url)
 
-                citations_url = config.get("gscholar", "BASE_SCHOLAR_URL") + config.get("gscholar",
-                                                                                        "SCHOLAR_CITATIONS_URL") + scholar_id + config.get(
-                    "gscholar", "SCHOLAR_URL_POSTFIX")
+    # waits for page to load (up to 5s)
+    try:
+        element_present = EC.presence_of_element_located((By.ID, 'gs_rdy'))
+        WebDriverWait(browser_driver, 5).until(element_present)
+    except TimeoutException:
+        print(
+            "Timed out waiting for page to load. Try again later. If the problem persists consider increasing timeout period.")
+        return True
+
+    with open(citation_file_name, "w", encoding="utf-8") as citation_file:
+        # then wait some extra random time
+        time_to_wait = randint(500, 1200)  # in ms
+        time.sleep(time_to_wait / 1000.0)
+
+        # firstly "reveal" all publications associated with the particular person
+        more_button = browser_driver.find_element_by_xpath(".//*[@id='gsc_bpf_more']")
+        is_more_button_disabled = more_button.get_attribute("disabled")
+        while not is_more_button_disabled:
+            time_to_wait = randint(500, 1500)  # in ms
+            time.sleep(time_to_wait / 1000.0)
 
-                browser_driver.get(citations_url)
+            move_to_element(more_button, browser_driver)
 
-                # waits for page to load (up to 5s)
-                try:
-                    element_present = EC.presence_of_element_located((By.ID, 'gs_rdy'))
-                    WebDriverWait(browser_driver, 5).until(element_present)
-                except TimeoutException:
-                    print(
-                        "Timed out waiting for page to load. Try again later. If the problem persists consider increasing timeout period.")
-                    continue
+            # again, some browser drivers throw exception on trying to click disabled button
+            try:
+                more_button.click()
+            except InvalidElementStateException:
+                pass
 
-                with open(citation_file_name, "w", encoding="utf-8") as citation_file:
-                    # then wait some extra random time
-                    time_to_wait = randint(500, 1200)  # in ms
-                    time.sleep(time_to_wait / 1000.0)
+            is_more_button_disabled = more_button.get_attribute("disabled")
 
-                    # firstly "reveal" all publications associated with the particular person
-                    more_button = browser_driver.find_element_by_xpath(".//*[@id='gsc_bpf_more']")
-                    is_more_button_disabled = more_button.get_attribute("disabled")
-                    while not is_more_button_disabled:
-                        time_to_wait = randint(500, 1500)  # in ms
-                        time.sleep(time_to_wait / 1000.0)
+        print('Cannot click "Show More" Button anymore. Presumably all results are now loaded')
 
-                        move_to_element(more_button, browser_driver)
+        publication_entries = browser_driver.find_elements_by_xpath(".//*[@id='gsc_a_b']/tr/td[1]/a")
+        for idx, entry in enumerate(publication_entries):
+            move_to_element(entry, browser_driver)
 
-                        # again, some browser drivers throw exception on trying to click disabled button
-                        try:
-                            more_button.click()
-                        except InvalidElementStateException:
-                            pass
+            # gets url for individual publication entry and goes to the page
+            publication_url = entry.get_attribute('href')
 
-                        is_more_button_disabled = more_button.get_attribute("disabled")
+            browser_driver.execute_script("window.open('');")
+            publication_window_handle = browser_driver.window_handles[-1]
+            browser_driver.switch_to.window(publication_window_handle)
 
-                    print('Cannot click "Show More" Button anymore. Presumably all results are now loaded')
+            browser_driver.get(publication_url)
+            try:
+                element_present = EC.presence_of_element_located((By.ID, 'gs_rdy'))
+                WebDriverWait(browser_driver, 5).until(element_present)
+            except TimeoutException:
+                print("Timed out waiting for page to load. Try again later")
+                return False
 
-                    publication_entries = browser_driver.find_elements_by_xpath(".//*[@id='gsc_a_b']/tr/td[1]/a")
-                    for idx, entry in enumerate(publication_entries):
-                        move_to_element(entry, browser_driver)
+            # then wait some extra random time
+            time_to_wait = randint(500, 1200)  # in ms
+            time.sleep(time_to_wait / 1000.0)
 
-                        # gets url for individual publication entry and goes to the page
-                        publication_url = entry.get_attribute('href')
+            citation_export_handle = browser_driver.find_element_by_xpath(".//*[@id='gsc_btn_exp-bd']")
+            citation_export_handle.click()
 
-                        browser_driver.execute_script("window.open('');")
-                        publication_window_handle = browser_driver.window_handles[-1]
-                        browser_driver.switch_to.window(publication_window_handle)
+            time_to_wait = randint(500, 800)  # in ms
+            time.sleep(time_to_wait / 1000.0)
 
-                        browser_driver.get(publication_url)
-                        try:
-                            element_present = EC.presence_of_element_located((By.ID, 'gs_rdy'))
-                            WebDriverWait(browser_driver, 5).until(element_present)
-                        except TimeoutException:
-                            print("Timed out waiting for page to load. Try again later")
-                            return
+            # goes to the page containing bibtex data and scraps it
+            bibtex_export_button_handle = browser_driver.find_element_by_xpath(
+                ".//*[@id='gsc_btn_exp-md']/ul/li[1]")
+            bibtex_export_button_handle.click()
 
-                        # then wait some extra random time
-                        time_to_wait = randint(500, 1200)  # in ms
-                        time.sleep(time_to_wait / 1000.0)
+            WebDriverWait(browser_driver, 10).until(
+                EC.presence_of_element_located((By.TAG_NAME, "pre"))
+            )
 
-                        citation_export_handle = browser_driver.find_element_by_xpath(".//*[@id='gsc_btn_exp-bd']")
-                        citation_export_handle.click()
+            citation = browser_driver.find_element_by_tag_name('pre').text
 
-                        time_to_wait = randint(500, 800)  # in ms
-                        time.sleep(time_to_wait / 1000.0)
+            time_to_wait = randint(500, 1200)  # in ms
+            time.sleep(time_to_wait / 1000.0)
 
-                        # goes to the page containing bibtex data and scraps it
-                        bibtex_export_button_handle = browser_driver.find_element_by_xpath(
-                            ".//*[@id='gsc_btn_exp-md']/ul/li[1]")
-                        bibtex_export_button_handle.click()
+            citation_file.write(citation + "\n")
 
-                        WebDriverWait(browser_driver, 10).until(
-                            EC.presence_of_element_located((By.TAG_NAME, "pre"))
-                        )
+            print("Current citation: " + str(idx + 1) + " for " + person)
 
-                        citation = browser_driver.find_element_by_tag_name('pre').text
+            browser_driver.close()
+            browser_driver.switch_to.window(main_window_handle)
+            time_to_wait = randint(400, 1200)  # in ms
+            time.sleep(time_to_wait / 1000.0)
 
-                        time_to_wait = randint(500, 1200)  # in ms
-                        time.sleep(time_to_wait / 1000.0)
+    return True
 
-                        citation_file.write(citation + "\n")
 
-                        print("Current citation: " + str(idx + 1) + " for " + person)
+def get_gscholar_citations(config, citations_directory="citations"):
+    """
+    Since Google Scholar does not have any public API and they do not like people automatically scraping their resources,
+    we need to "fool" them that the script is a real person so they would not block it.
+
+    For that reason all waiting times are randomly generated so that it would not seem too unhuman.
+
+    The script goes through profiles of each specified person and then pulls bibtex citations for all of their listed publications
 
-                        browser_driver.close()
-                        browser_driver.switch_to.window(main_window_handle)
-                        time_to_wait = randint(400, 1200)  # in ms
-                        time.sleep(time_to_wait / 1000.0)
+    :param config: object representing the configuration file specifying parameters of the job
+    :param citations_directory: directory in which the citation files are saved
+    """
+
+    scholar_ids = json.loads(config.get("gscholar", "scholar_ids"))
+
+    browser_driver = open_browser(config)
+
+    for keyval in scholar_ids:
+        try:
+            # this is due to the way the json is structured; each person is represented as an object with single attribute person : scholar id;
+            for person, scholar_id in keyval.items():
+                if not get_gscholar_person_citations(config, browser_driver, person, scholar_id, citations_directory):
+                    return
 
         # if procedure is forcefully terminated, make sure to close the browser
         except KeyboardInterrupt:
@@ -43,12 +43,37 @@ except ImportError:
     import ConfigParser
 
 import os
+import sys
 
-from gscholar import get_gscholar_citations
-from orcid import get_orcid_citations
-from parse_bibtex import clean_up_html
-from parse_bibtex import parse_bibtex
-from pubmed import get_pubmed_citations
+# modules of the particular stages (and their heavy dependencies, such as selenium, lxml or pybtex)
+# are imported only if the stage is enabled, so that the script starts quickly otherwise
+
+
+def get_stage_modules(config):
+    """
+    Gets modules of the stages enabled in the configuration file, i.e. the modules main() is going to import
+    (used by benchmark_importtime.py to measure the start of the script)
+
+    :param config: object representing the configuration file specifying parameters of the job
+    :return: list of names of the modules
+    """
+    stage_modules = list()
+    if config.get("orcid", "DO_ORCID") == "True":
+        stage_modules.append("orcid")
+    if config.get("pubmed", "DO_PUBMED") == "True":
+        stage_modules.append("pubmed")
+    if config.get("gscholar", "DO_GSCHOLAR") == "True":
+        stage_modules.append("gscholar")
+    if config.get("bibtex", "PARSE_OUTPUT") == "True":
+        stage_modules.append("parse_bibtex")
+
+    # querying the sources concurrently only pays off if there are several of them;
+    # otherwise the sources are queried one after another, without loading asyncio
+    enabled_sources = [module for module in stage_modules if module in ("orcid", "pubmed", "gscholar")]
+    if sys.version_info >= (3, 5) and len(enabled_sources) > 1:
+        stage_modules.append("engine")
+
+    return stage_modules
 
 
 # Todo: reduce file IO and instead pass the objects around
@@ -68,21 +93,36 @@ def main():
     if not os.path.exists("citations"):
         os.makedirs("citations")
 
-    if do_orcid == "True":
-        get_orcid_citations(config)
+    if "engine" in get_stage_modules(config):
+        # all the sources are queried concurrently and the citations are combined as they come (see engine.py)
+        from engine import get_citations
+        try:
+            get_citations(config)
+        except IOError:
+            return  # no point doing in continuing
+    else:
+        if do_orcid == "True":
+            from orcid import get_orcid_citations
+            get_orcid_citations(config)
+
+        if do_pubmed == "True":
+            from pubmed import get_pubmed_citations
+            get_pubmed_citations(config)
 
-    if do_pubmed == "True":
-        get_pubmed_citations(config)
+        if do_gscholar == "True":
+            from gscholar import get_gscholar_citations
+            get_gscholar_citations(config)
 
-    if do_gscholar == "True":
-        get_gscholar_citations(config)
+        if parse_outputs == "True":
+            from parse_bibtex import parse_bibtex
+            try:
+                parse_bibtex(config)
+            except IOError:
+                return  # no point doing in continuing
 
     if parse_outputs == "True":
-        try:
-            parse_bibtex(config)
-        except IOError:
-            return  # no point doing in continuing
-        clean_up_html()
+        from parse_bibtex import clean_up_html
+        clean_up_html(config.get("bibtex", "output_directory"))
 
 
 if __name__ == '__main__':
@@ -3,23 +3,60 @@ import os
 
 # try to import modules for python3, if failed, fallback to python2
 try:
-    from urllib.request import urlopen
     from urllib.error import HTTPError
 except ImportError:
-    from urllib2 import urlopen
     from urllib2 import HTTPError
 
 from lxml import etree
 from io import open
 
+from connection_pool import read_url
 
-def get_orcid_citations(config):
+
+def get_orcid_person_citations(config, person, orcid, citations_directory="citations"):
+    """
+    Gets citations listed in ORCID profile of a single person and saves them to the person's citation file
+
+    :param config: object representing the configuration file specifying parameters of the job
+    :param person: name of the person
+    :param orcid: orcid of the person
+    :param citations_directory: directory in which the citation files are saved
+    :return: number of citations which were not entered in bibtex format or None if the person has no orcid records
+    """
+    print("[Orcid] Getting citations for " + person)
+    unspecified_format = 0
+    url = config.get("orcid", "BASE_ORCID_API_URL") + orcid + config.get("orcid", "ORCID_WORKS_URL")
+    try:
+        works_xml_string = read_url(url)
+    except HTTPError:
+        print("There are no orcid records for " + person)
+        return None
+
+    xml_parse_tree = etree.fromstring(works_xml_string)
+
+    citation_file_name = os.path.join(citations_directory, "".join(person.split()) + "_fromORCID.bib")
+    with open(citation_file_name, "w", encoding="utf-8") as citation_file:
+        for work_citation in xml_parse_tree.xpath('//*[local-name()="work-citation"]'):
+            work_citation_type = work_citation[0].text
+            citation = work_citation[1].text + "\n"
+
+            citation = citation.encode("utf-8").decode("utf-8")
+            citation_file.write(citation)
+
+            if not work_citation_type == 'bibtex':
+                unspecified_format += 1
+
+    return unspecified_format
+
+
+def get_orcid_citations(config, citations_directory="citations"):
     """
     This method is using ORCID public API in order to obtain XML document representing each person's profile.
     It is then parsed to get all listed citations.
     They are then distinguished based on weather they are entered in bibtex format or presumably pre-formatted .
 
     :param config: object representing the configuration file specifying parameters of the job
+    :param citations_directory: directory in which the citation files are saved
     """
 
     # dict of String - Integer of how many non-bibtex citations given person has
@@ -33,29 +70,17 @@ def get_orcid_citations(config):
         # this is due to the way the json is structured;
         # each person is represented as an object with single attribute person : orcid;
         for person, orcid in keyval.items():
-            print("[Orcid] Getting citations for " + person)
-            unspecified_format[person] = 0
-            url = config.get("orcid", "BASE_ORCID_API_URL") + orcid + config.get("orcid", "ORCID_WORKS_URL")
-            try:
-                works_xml_string = urlopen(url).read()
-            except HTTPError:
-                print("There are no orcid records for " + person)
-                continue
+            unspecified_format[person] = get_orcid_person_citations(config, person, orcid, citations_directory) or 0
 
-            xml_parse_tree = etree.fromstring(works_xml_string)
+    print_unspecified_format_summary(unspecified_format)
 
-            citation_file_name = os.path.join("citations", "".join(person.split()) + "_fromORCID.bib")
-            with open(citation_file_name, "w", encoding="utf-8") as citation_file:
-                for work_citation in xml_parse_tree.xpath('//*[local-name()="work-citation"]'):
-                    work_citation_type = work_citation[0].text
-                    citation = work_citation[1].text + "\n"
 
-                    citation = citation.encode("utf-8").decode("utf-8")
-                    citation_file.write(citation)
-
-                    if not work_citation_type == 'bibtex':
-                        unspecified_format[person] += 1
+def print_unspecified_format_summary(unspecified_format):
+    """
+    Prints how many citations of each person were not entered in bibtex format
 
+    :param unspecified_format: dict of numbers of non-bibtex citations of each person
+    """
     total_unspecified = sum(unspecified_format.values())
     if total_unspecified:
         print("ORCID " + str(total_unspecified) +
@@ -5,8 +5,7 @@ import subprocess
 import sys
 from io import open
 
-import pybtex
-import pybtex.database
+from bibtex_records import BibtexIndex
 
 bibtex2html_directory = "bibtex2html"
 
@@ -77,69 +76,96 @@ def parse_mixed_source(source_file):
 
 unique_cite_keys = set()
 
+# bibtex citation key is second group of that regex: (@cite_type{ or @cite_type()(cite_key)(,);
+# @string, @preamble and @comment entries do not have citation keys
+citation_key_regex = re.compile(r'(@[ \t]*(?!(?:string|preamble|comment)\b)[A-Za-z]+[ \t]*[{(])([^,\r\n]+?)(,)',
+                                re.IGNORECASE)
 
-# for re.sup (much easier to read than the lambda would have been otherwise for same purpose)
-# say "Turing1950" key is used by two independent citations, then the second one is changed to "Turing1950a"
-def fix_citation_keys(matchobj):
+
+def get_unique_citation_key(citation_key):
     """
-    Used as an auxiliary method in remove_bibtex_duplicates() method;
-    used in order to make correct substitutions in possibly duplicate bibtex citation keys
+    Makes sure the citation key was not already used by another citation;
+    say "Turing1950" key is used by two independent citations, then the second one is changed to "Turing1950a"
 
-    :param matchobj: matched object in the regex (in that case a bibtex citation key)
+    :param citation_key: bibtex citation key
     :return: adjusted (or not) bibtex citation key
     """
-    cleaned_cite_key = matchobj.group(2).lstrip()
-    temp_citation_key = cleaned_cite_key
+    temp_citation_key = citation_key
     while temp_citation_key in unique_cite_keys:
         temp_citation_key += "a"
 
     unique_cite_keys.add(temp_citation_key)
-    return matchobj.group(1) + temp_citation_key + matchobj.group(3)
+    return temp_citation_key
 
 
-def remove_bibtex_duplicates(combined_bibtex_file):
+# for re.sup (much easier to read than the lambda would have been otherwise for same purpose)
+def fix_citation_keys(matchobj):
     """
-    Tries to remove duplicate entries from bibtex citations
-    In order to do this, it uses pybtex library that parse the citations
+    Used as an auxiliary method in ensure_unique_citation_keys() method;
+    used in order to make correct substitutions in possibly duplicate bibtex citation keys
 
-    :param combined_bibtex_file:
-    :return:
+    :param matchobj: matched object in the regex (in that case a bibtex citation key)
+    :return: adjusted (or not) bibtex citation key
     """
+    return matchobj.group(1) + get_unique_citation_key(matchobj.group(2).strip()) + matchobj.group(3)
 
-    # firstly ensures unique citation keys for easier manipulation (and because pybtex would throw an exception otherwise)
-    with open(combined_bibtex_file, 'r', encoding='utf-8') as combined_bibtex:
-        unique_keys_data = re.sub(r'(@.*?\{)(.+?)(,)', fix_citation_keys,
-                                  combined_bibtex.read())  # bibtex citation key is second group of that regex: (@cite_type)(cite_key)(,)
 
-    with open(combined_bibtex_file, 'w', encoding='utf-8') as combined_bibtex:
-        combined_bibtex.write(unique_keys_data)
+def ensure_unique_citation_keys(bibtex_data):
+    """
+    Ensures unique citation keys for easier manipulation (and because bibtex2html could not tell the entries apart otherwise)
+
+    :param bibtex_data: string with bibtex citations
+    :return: adjusted bibtex data
+    """
+    return citation_key_regex.sub(fix_citation_keys, bibtex_data)
 
-    bib_data = pybtex.database.parse_file(combined_bibtex_file)
 
-    citation_keys = list()
-    for citation_key in bib_data.entries:
-        citation_keys.append(citation_key)
+def read_bibtex_entries(combined_bibtex_file, citation_file_ranges=None):
+    """
+    Indexes the entries of the combined bibtex file in a single pass over the memory-mapped file.
+    Lightweight records (citation key, year, title hash, offset, ...) are created instead of full pybtex entries,
+    as only the years and titles are needed to group them and remove duplicates
+
+    :param combined_bibtex_file: file containing the citations (with unique citation keys)
+    :param citation_file_ranges: dict of (start, end) byte ranges each citation file takes in the combined file (as returned by combine_citation_files())
+    :return: index of the entries; it has to be closed once it is no longer needed
+    """
+    return BibtexIndex(combined_bibtex_file, citation_file_ranges)
+
 
-    entry_year = dict()
+def find_duplicate_entries(records):
+    """
+    Finds entries repeating the title of an entry preceding them
+
+    :param records: records of the entries to consider, in order of appearance
+    :return: set of citation keys of the duplicate entries
+    """
     entries_to_exclude = set()
     unique_titles = set()
-    for citation_key in citation_keys:
-        try:
-            entry_year[citation_key] = bib_data.entries[citation_key].fields['year']
-            if entry_year[citation_key] == '' or entry_year[citation_key] == ' ':
-                entry_year[citation_key] = 'none'
-        except KeyError:
-            entry_year[citation_key] = 'none'
-        title = bib_data.entries[citation_key].fields['title']
-        while title[0] == '{' and title[-1] == '}':  # some titles had double brackets, i.e. {{someTitle}}
-            title = title[1:-1]
-        if title not in unique_titles:
-            unique_titles.add(title)
+    for record in records:
+        if record.title_hash is None:
+            continue
+        if record.title_hash not in unique_titles:
+            unique_titles.add(record.title_hash)
         else:
             entries_to_exclude.add(
-                citation_key)  # if multiple entries have same title, it is safe to assume they represent same publications
+                record.key)  # if multiple entries have same title, it is safe to assume they represent same publications
+
+    return entries_to_exclude
+
+
+def remove_bibtex_duplicates(combined_bibtex_file, citation_file_ranges=None):
+    """
+    Tries to remove duplicate entries from bibtex citations
+
+    :param combined_bibtex_file: file containing the citations (with unique citation keys)
+    :param citation_file_ranges: dict of (start, end) byte ranges each citation file takes in the combined file
+    :return: tuple with set of citation keys of duplicate entries and index of all the entries (which has to be closed)
+    """
+    bibtex_index = read_bibtex_entries(combined_bibtex_file, citation_file_ranges)
+    entries_to_exclude = find_duplicate_entries(bibtex_index.records)
 
-    return entries_to_exclude, entry_year
+    return entries_to_exclude, bibtex_index
 
 
 def remove_nonbibtex_duplicates(combined_nonbibtex_file):
@@ -174,102 +200,130 @@ def remove_nonbibtex_duplicates(combined_nonbibtex_file):
                     '\r\n'))  # makes it into a list as it will be put inside a html file; Possible todo, if theres need for it: make it a variable
 
 
-def combine_citation_files(combined_bibtex_file, combined_non_bibtex_file):
+# even though APA ignores months, let's make the converter not throw warnings of incorrect format, so that it would work if the citation style changed:
+bibtex_replacements = {"{\\textquotesingle}": "'",
+                       "{\\textperiodcentered}": "{\cdot}",
+                       "{\\textgreater}": "$>$",
+                       "{\\textless}": "%<%",
+                       "{\$}\\backslashvarepsilon{\$}": "$\\varepsilon$",
+                       "\\upbeta": "\\beta",
+                       "{jan}": "jan",
+                       "{feb}": "feb",
+                       "{mar}": "mar",
+                       "{apr}": "apr",
+                       "{may}": "may",
+                       "{jun}": "jun",
+                       "{jul}": "jul",
+                       "{aug}": "aug",
+                       "{sep}": "sep",
+                       "{oct}": "oct",
+                       "{nov}": "nov",
+                       "{dec}": "dec",
+                       }
+bibtex_replacements = dict((re.escape(k), v) for k, v in bibtex_replacements.items())
+bibtex_replacements_pattern = re.compile("|".join(bibtex_replacements.keys()))
+
+
+def clean_up_bibtex(bibtex_data):
     """
-    Combines all the previously generated bibtex-citation files to html files divided by publication year
+    Replaces the strings bibtex2html has issues with (see bibtex_replacements)
 
-    :param combined_bibtex_file:
-    :param combined_non_bibtex_file:
+    :param bibtex_data: string with bibtex citations
+    :return: cleaned up bibtex data
     """
+    return bibtex_replacements_pattern.sub(lambda m: bibtex_replacements[re.escape(m.group(0))], bibtex_data)
 
-    # there are no citations files, no point in running the procedure
-    if not os.listdir("citations"):
-        raise IOError
 
-    with open(combined_bibtex_file, "w", encoding='utf-8') as combined_bibtex:
-        with open(combined_non_bibtex_file, "w", encoding='utf-8') as combined_nonbibtex:
-            for file in os.listdir("citations"):
-                if file.endswith(
-                        "ORCID.bib"):  # gscholar and pubmed guarantee consistent structures, only ORCID doesn't because people enter their works themselves; if required can be extended with extra clauses
-                    (bibtex_citations, nonbibtex_citations) = parse_mixed_source(os.path.join("citations", file))
-                    for bibtex_citation in bibtex_citations:
-                        bibtex_citation += "\n"
-                        bibtex_citation = bibtex_citation
-
-                        combined_bibtex.write(bibtex_citation)
-
-                    for nonbibtex_citation in nonbibtex_citations:
-                        nonbibtex_citation += "\n"
-                        nonbibtex_citation = nonbibtex_citation
-                        combined_nonbibtex.write(nonbibtex_citation)
-
-        for file in os.listdir("citations"):
-            if not file.endswith("ORCID.bib"):  # same reason as before
-                combined_bibtex.write(open(os.path.join("citations", file), 'r', encoding='utf-8').read())
-
-    with open(combined_bibtex_file, 'r', encoding='utf-8') as combined_bibtex:
-        bibtex_data = combined_bibtex.read()
-
-    # even though APA ignores months, let's make the converter not throw warnings of incorrect format, so that it would work if the citation style changed:
-    rep = {"{\\textquotesingle}": "'",
-           "{\\textperiodcentered}": "{\cdot}",
-           "{\\textgreater}": "$>$",
-           "{\\textless}": "%<%",
-           "{\$}\\backslashvarepsilon{\$}": "$\\varepsilon$",
-           "\\upbeta": "\\beta",
-           "{jan}": "jan",
-           "{feb}": "feb",
-           "{mar}": "mar",
-           "{apr}": "apr",
-           "{may}": "may",
-           "{jun}": "jun",
-           "{jul}": "jul",
-           "{aug}": "aug",
-           "{sep}": "sep",
-           "{oct}": "oct",
-           "{nov}": "nov",
-           "{dec}": "dec",
-           }
-    # perform the replacement
-    rep = dict((re.escape(k), v) for k, v in rep.items())
-    pattern = re.compile("|".join(rep.keys()))
-    new_bibtex_data = pattern.sub(lambda m: rep[re.escape(m.group(0))], bibtex_data)
-
-    with open(combined_bibtex_file, 'w', encoding='utf-8') as combined_bibtex:
-        combined_bibtex.write(new_bibtex_data)
+def read_citation_file(citation_file, citations_directory):
+    """
+    Reads a single citation file and cleans up its bibtex citations (their citation keys are not made unique yet)
+
+    :param citation_file: name of the citation file
+    :param citations_directory: directory containing the citation files
+    :return: tuple with string with the bibtex citations and list of strings with nonbibtex citations
+    """
+    if citation_file.endswith(
+            "ORCID.bib"):  # gscholar and pubmed guarantee consistent structures, only ORCID doesn't because people enter their works themselves; if required can be extended with extra clauses
+        (bibtex_citations, nonbibtex_citations) = parse_mixed_source(os.path.join(citations_directory, citation_file))
+        return "".join(clean_up_bibtex(bibtex_citation + "\n") for bibtex_citation in bibtex_citations), \
+            nonbibtex_citations
 
+    with open(os.path.join(citations_directory, citation_file), 'r', encoding='utf-8') as citation_file_handle:
+        return clean_up_bibtex(citation_file_handle.read()), list()
 
-def parse_bibtex(config):
+
+def order_citation_files(citation_files):
     """
-    Parses the obtained citation files by first combining them together and trying to remove duplicates.
-    They are then separated by year and corresponding html files are generated
-    To do it, it uses the bibtex2html tool created by Jean-Christophe Filliatre (https://github.com/backtracking/bibtex2html)
+    Orders the citation files the way they are combined; ORCID files go first, same as they always did,
+    and the order is fixed so that the same citation keys are suffixed (and the same duplicates are kept) every time
 
-    :param config: object representing the configuration file specifying parameters of the job
+    :param citation_files: names of the citation files
+    :return: sorted list of names of the citation files
     """
+    return sorted(citation_files, key=lambda citation_file: (not citation_file.endswith("ORCID.bib"), citation_file))
 
-    combined_directory = "combined"
 
-    output_directory = config.get('bibtex', 'output_directory')
-    if not os.path.exists(output_directory):
-        os.makedirs(output_directory)
+def append_citation_file(citation_file, citations_directory, combined_bibtex, combined_nonbibtex,
+                         read_file=read_citation_file):
+    """
+    Appends citations of a single citation file to the combined files
+
+    :param citation_file: name of the citation file
+    :param citations_directory: directory containing the citation files
+    :param combined_bibtex: opened combined bibtex file
+    :param combined_nonbibtex: opened combined nonbibtex file
+    :param read_file: function reading the citation file, see read_citation_file()
+    :return: tuple with (start, end) byte range the bibtex citations of the file take in the combined bibtex file
+    """
+    (bibtex_data, nonbibtex_citations) = read_file(citation_file, citations_directory)
 
-    combined_bibtex_file = os.path.join(combined_directory, "combined_bibtex.bib")
-    combined_nonbibtex_file = os.path.join(output_directory, "combined_nonbibtex_citations.txt")
+    # entries are matched to their citation files by where they are, as their citation keys may be read differently
+    start = combined_bibtex.tell()
+    combined_bibtex.write(ensure_unique_citation_keys(bibtex_data))
+    end = combined_bibtex.tell()
 
-    if not os.path.exists(combined_directory):
-        os.makedirs(combined_directory)
+    for nonbibtex_citation in nonbibtex_citations:
+        nonbibtex_citation += "\n"
+        combined_nonbibtex.write(nonbibtex_citation)
 
-    # if there are no citations files to combine, throw exception up, so that the script would not try to clean html which does and will not exist
-    try:
-        combine_citation_files(combined_bibtex_file, combined_nonbibtex_file)
-    except IOError as e:
-        print("There are no citations files to combine")
-        raise e
+    return start, end
 
-    remove_nonbibtex_duplicates(combined_nonbibtex_file)
-    (entries_to_exclude, entry_year) = remove_bibtex_duplicates(combined_bibtex_file)
 
+def combine_citation_files(combined_bibtex_file, combined_non_bibtex_file, citations_directory="citations",
+                           read_file=read_citation_file):
+    """
+    Combines all the previously generated bibtex-citation files to html files divided by publication year.
+    Each citation is cleaned up before it is written, so the combined file is written in a single pass
+
+    :param combined_bibtex_file:
+    :param combined_non_bibtex_file:
+    :param citations_directory: directory containing the citation files
+    :param read_file: function reading the citation files, see read_citation_file()
+    :return: dict of (start, end) byte ranges each citation file takes in the combined bibtex file
+    """
+
+    # there are no citations files, no point in running the procedure
+    if not os.listdir(citations_directory):
+        raise IOError
+
+    unique_cite_keys.clear()  # keys might have been collected by a previous run within the same process
+    citation_file_ranges = dict()
+
+    with open(combined_bibtex_file, "w", encoding='utf-8') as combined_bibtex:
+        with open(combined_non_bibtex_file, "w", encoding='utf-8') as combined_nonbibtex:
+            for file in order_citation_files(os.listdir(citations_directory)):
+                citation_file_ranges[file] = append_citation_file(file, citations_directory, combined_bibtex,
+                                                                  combined_nonbibtex, read_file)
+
+    return citation_file_ranges
+
+
+def get_bibtex2html_executable():
+    """
+    Gets location of the bibtex2html executable suitable for the platform the script is run on
+
+    :return: location of the executable
+    """
     platform_run_on = sys.platform
     if not platform_run_on.startswith('linux') and platform_run_on != 'win32' and platform_run_on != 'darwin':
         print("You are trying to run the script on an unrecognised platform. It will terminate now.")
@@ -278,18 +332,66 @@ def parse_bibtex(config):
     if platform_run_on == 'darwin':
         print("Warning: You are running the script on Mac OS X. It has not been tested on that platform.")
 
+    bibtex2html_executable = ""
+    if platform_run_on.startswith('linux'):
+        bibtex2html_executable = "bibtex2html_linux"
+    elif platform_run_on == "win32":
+        bibtex2html_executable = "bibtex2html_win32"
+    elif platform_run_on == "darwin":
+        bibtex2html_executable = "bibtex2html_osx"
+
+    return os.path.join(bibtex2html_directory, bibtex2html_executable)
+
+
+def group_entries_by_year(records, entries_to_exclude):
+    """
+    Divides the citations by their publication year
+
+    :param records: records of the entries
+    :param entries_to_exclude: citation keys of entries which should not be listed
+    :return: dict of sets of citation keys published in each year
+    """
     entries_by_year = dict()
-    for entry, year in entry_year.items():
-        if year not in entries_by_year:
-            entries_by_year[year] = set()
-        if entry not in entries_to_exclude:
-            entries_by_year[year].add(entry)
+    for record in records:
+        if record.year not in entries_by_year:
+            entries_by_year[record.year] = set()
+        if record.key not in entries_to_exclude:
+            entries_by_year[record.year].add(record.key)
+
+    return entries_by_year
+
 
-    if not os.path.exists('tmp'):
-        os.makedirs('tmp')
+def render_bibtex_years(entries_by_year, bibtex_index, output_directory, citation_style_file,
+                        tmp_directory="tmp"):
+    """
+    Generates html file for each publication year using the bibtex2html tool.
+    Entries of each year are sliced from the index into a separate file, so bibtex2html does not have to
+    read the whole combined file for every year
+
+    :param entries_by_year: dict of sets of citation keys published in each year
+    :param bibtex_index: index of the combined bibtex file
+    :param output_directory: location for the output html files
+    :param citation_style_file: name of the file defining the style of the citations
+    :param tmp_directory: location for the temporary files; it is removed afterwards
+    :return: names of the generated html files
+    """
+    bibtex2html_executable_location = get_bibtex2html_executable()
 
+    # for some reason the application does not correctly recognise style files if they are passed with the extension
+    if citation_style_file.endswith(".bst"):
+        citation_style_file = citation_style_file[:-4]
+
+    citation_style_file_location = os.path.join(bibtex2html_directory, citation_style_file)
+
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    if not os.path.exists(tmp_directory):
+        os.makedirs(tmp_directory)
+
+    output_files = list()
     for year, entries in entries_by_year.items():
-        tmp_file_directory = os.path.join('tmp', "year" + year)
+        tmp_file_directory = os.path.join(tmp_directory, "year" + year)
         if not os.path.exists(tmp_file_directory):
             os.makedirs(tmp_file_directory)
 
@@ -301,24 +403,10 @@ def parse_bibtex(config):
                 tmp_file_content = (entry + "\n").encode("utf-8").decode("utf-8")
                 tmp_file.write(tmp_file_content)
 
-        given_output_file = os.path.join(output_directory, 'output' + year)
-        citation_style_file = config.get("bibtex", "citation_style_file")
-
-        # for some reason the application does not correctly recognise style files if they are passed with the extension
-        if citation_style_file.endswith(".bst"):
-            citation_style_file = citation_style_file[:-4]
-
-        citation_style_file_location = os.path.join(bibtex2html_directory, citation_style_file)
+        year_bibtex_file = os.path.join(tmp_file_directory, 'citations.bib')
+        bibtex_index.write_entries(sorted(entries), year_bibtex_file)
 
-        bibtex2html_executable = ""
-        if platform_run_on.startswith('linux'):
-            bibtex2html_executable = "bibtex2html_linux"
-        elif platform_run_on == "win32":
-            bibtex2html_executable = "bibtex2html_win32"
-        elif platform_run_on == "darwin":
-            bibtex2html_executable = "bibtex2html_osx"
-
-        bibtex2html_executable_location = os.path.join(bibtex2html_directory, bibtex2html_executable)
+        given_output_file = os.path.join(output_directory, 'output' + year)
 
         args = [bibtex2html_executable_location,
                 '-o',
@@ -335,12 +423,76 @@ def parse_bibtex(config):
                 '-i',
                 '-citefile',
                 tmp_file_location,
-                combined_bibtex_file]
+                year_bibtex_file]
 
         subprocess.call(args)
 
+        if os.path.exists(given_output_file + ".html"):
+            output_files.append(os.path.basename(given_output_file) + ".html")
+
     # after finished, remove the created tmp directory (and its contents)
-    shutil.rmtree('tmp')
+    shutil.rmtree(tmp_directory)
+
+    return output_files
+
+
+def get_combined_files(config):
+    """
+    Gets locations of the combined files (and creates their directories)
+
+    :param config: object representing the configuration file specifying parameters of the job
+    :return: tuple with locations of the combined bibtex and nonbibtex files
+    """
+    combined_directory = "combined"
+
+    output_directory = config.get('bibtex', 'output_directory')
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    combined_bibtex_file = os.path.join(combined_directory, "combined_bibtex.bib")
+    combined_nonbibtex_file = os.path.join(output_directory, "combined_nonbibtex_citations.txt")
+
+    if not os.path.exists(combined_directory):
+        os.makedirs(combined_directory)
+
+    return combined_bibtex_file, combined_nonbibtex_file
+
+
+def render_combined_files(config, combined_bibtex_file, combined_nonbibtex_file):
+    """
+    Removes duplicates from the combined files and generates html files of each publication year
+
+    :param config: object representing the configuration file specifying parameters of the job
+    :param combined_bibtex_file: file containing the bibtex citations
+    :param combined_nonbibtex_file: file containing the nonbibtex citations
+    """
+    remove_nonbibtex_duplicates(combined_nonbibtex_file)
+    (entries_to_exclude, bibtex_index) = remove_bibtex_duplicates(combined_bibtex_file)
+
+    with bibtex_index:
+        entries_by_year = group_entries_by_year(bibtex_index.records, entries_to_exclude)
+        render_bibtex_years(entries_by_year, bibtex_index, config.get('bibtex', 'output_directory'),
+                            config.get("bibtex", "citation_style_file"))
+
+
+def parse_bibtex(config):
+    """
+    Parses the obtained citation files by first combining them together and trying to remove duplicates.
+    They are then separated by year and corresponding html files are generated
+    To do it, it uses the bibtex2html tool created by Jean-Christophe Filliatre (https://github.com/backtracking/bibtex2html)
+
+    :param config: object representing the configuration file specifying parameters of the job
+    """
+    (combined_bibtex_file, combined_nonbibtex_file) = get_combined_files(config)
+
+    # if there are no citations files to combine, throw exception up, so that the script would not try to clean html which does and will not exist
+    try:
+        combine_citation_files(combined_bibtex_file, combined_nonbibtex_file)
+    except IOError as e:
+        print("There are no citations files to combine")
+        raise e
+
+    render_combined_files(config, combined_bibtex_file, combined_nonbibtex_file)
 
 
 def is_valid_paragraph(paragraph):
@@ -349,13 +501,20 @@ def is_valid_paragraph(paragraph):
     return True
 
 
-def clean_up_html():
+def clean_up_html(output_directory="output", output_files=None):
     """
     Cleans up the created html files (removes extra newlines, changes paragraphs into lists, etc)
 
+    :param output_directory: location of the output html files
+    :param output_files: if specified, only those files are cleaned up (files already cleaned up must not be cleaned again)
     """
-    for output_file in os.listdir("output"):
-        output_file = os.path.join("output", output_file)
+    if output_files is None:
+        # the directory may contain other directories, e.g. outputs of other groups (see batch.py)
+        output_files = [output_file for output_file in os.listdir(output_directory)
+                        if os.path.isfile(os.path.join(output_directory, output_file))]
+
+    for output_file in output_files:
+        output_file = os.path.join(output_directory, output_file)
         with open(output_file, "r", encoding='ISO-8859-1') as html_file:
             html_file_content = html_file.read()
 
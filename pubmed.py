@@ -1,15 +1,30 @@
 import json
 import os
 
-# try to import modules for python3, if failed, fallback to python2
-try:
-    from urllib.request import urlopen
-except ImportError:
-    from urllib2 import urlopen
-
 from lxml import etree
 from io import open
 
+from connection_pool import RateLimiter
+from connection_pool import read_url
+
+# NCBI allows at most 3 requests per second without an API key; the limit is shared by all the threads querying PubMed
+ncbi_rate_limiter = RateLimiter(3)
+
+# compiled pubmed2bibtex.xsl transformation; compiled once and then reused for every person
+bibtex_transform = None
+
+
+def get_bibtex_transform():
+    """
+    :return: compiled XSLT transformation of PubMed XML documents into bibtex citations
+    """
+    global bibtex_transform
+    if bibtex_transform is None:
+        xslt_root = etree.parse('pubmed2bibtex.xsl')
+        bibtex_transform = etree.XSLT(xslt_root)
+
+    return bibtex_transform
+
 
 def get_search_name_string(name):
     """
@@ -24,47 +39,58 @@ def get_search_name_string(name):
     return last_name + ",%20" + first_name + "[Full%20Author%20Name]"
 
 
-def get_pubmed_citations(config):
+def get_pubmed_person_citations(config, person, citations_directory="citations"):
     """
-    This method is using ncbi public API in order to obtain XML document representing each person's profile.
-    It is then parsed to get ids of all works (co-)published by the person.
-    Then another query is performed in order to get publication details for the works specified
+    Gets citations of works (co-)published by a single person and saves them to the person's citation file
 
     :param config: object representing the configuration file specifying parameters of the job
+    :param person: name of the person
+    :param citations_directory: directory in which the citation files are saved
     """
+    print("[PubMed] Getting citations for " + person)
+    search_url = config.get("pubmed", "BASE_SEARCH_URL") + get_search_name_string(person)
+    uids_xml_string = read_url(search_url, ncbi_rate_limiter)
+    uid_xml_parse_tree = etree.fromstring(uids_xml_string)
+    uid_search_string = ""
 
-    people = json.loads(config.get("pubmed", "people_to_check"))
-    for person in people:
-        print("[PubMed] Getting citations for " + person)
-        search_url = config.get("pubmed", "BASE_SEARCH_URL") + get_search_name_string(person)
-        uids_xml_string = urlopen(search_url).read()
-        uid_xml_parse_tree = etree.fromstring(uids_xml_string)
-        uid_search_string = ""
+    for uid in uid_xml_parse_tree.xpath('//Id'):
+        uid_search_string = uid_search_string + uid.text + ","
 
-        for uid in uid_xml_parse_tree.xpath('//Id'):
-            uid_search_string = uid_search_string + uid.text + ","
+    if not uid_search_string:
+        print(person + " does not have any publications on PubMed")
+        return  # there are no works for the given person on ncbi
 
-        if not uid_search_string:
-            print(person + " does not have any publications on PubMed")
-            continue  # there are no works for the given person on ncbi
+    uid_search_string = uid_search_string[:-1]  # removes comma at the end
+    uid_search_url = config.get("pubmed",
+                                "BASE_INFO_URL") + uid_search_string + "&retmode=xml"  # requests the response to contain xml file which is way easier to parse
 
-        uid_search_string = uid_search_string[:-1]  # removes comma at the end
-        uid_search_url = config.get("pubmed",
-                                    "BASE_INFO_URL") + uid_search_string + "&retmode=xml"  # requests the response to contain xml file which is way easier to parse
+    works_xml_string = read_url(uid_search_url, ncbi_rate_limiter)
+    works_xml_parse_tree = etree.fromstring(works_xml_string)
 
-        works_xml_string = urlopen(uid_search_url).read()
-        works_xml_parse_tree = etree.fromstring(works_xml_string)
+    # transforms the part of xml tree containing cited works to be bibtex-like formatted
+    transform = get_bibtex_transform()
+    bibtex_data = transform(works_xml_parse_tree)
+    bibtex_data = str(bibtex_data)  # etree.tostring(bibtex_data)
+    try:
+        bibtex_data = bibtex_data.decode("utf-8")  # python 2
+    except AttributeError:
+        pass  # python 3
 
-        # transforms the part of xml tree containing cited works to be bibtex-like formatted
-        xslt_root = etree.parse('pubmed2bibtex.xsl')
-        transform = etree.XSLT(xslt_root)
-        bibtex_data = transform(works_xml_parse_tree)
-        bibtex_data = str(bibtex_data)  # etree.tostring(bibtex_data)
-        try:
-            bibtex_data = bibtex_data.decode("utf-8")  # python 2
-        except AttributeError:
-            pass  # python 3
-
-        citation_file_name = os.path.join("citations", "".join(person.split()) + "_fromPubmed.bib")
-        with open(citation_file_name, "w", encoding="utf-8") as citation_file:
-            citation_file.write(bibtex_data)
+    citation_file_name = os.path.join(citations_directory, "".join(person.split()) + "_fromPubmed.bib")
+    with open(citation_file_name, "w", encoding="utf-8") as citation_file:
+        citation_file.write(bibtex_data)
+
+
+def get_pubmed_citations(config, citations_directory="citations"):
+    """
+    This method is using ncbi public API in order to obtain XML document representing each person's profile.
+    It is then parsed to get ids of all works (co-)published by the person.
+    Then another query is performed in order to get publication details for the works specified
+
+    :param config: object representing the configuration file specifying parameters of the job
+    :param citations_directory: directory in which the citation files are saved
+    """
+
+    people = json.loads(config.get("pubmed", "people_to_check"))
+    for person in people:
+        get_pubmed_person_citations(config, person, citations_directory)
@@ -0,0 +1,469 @@
+#!/usr/bin/python
+"""
+Service mode of the scripts; keeps running and refreshes citations of each person on its own schedule.
+Only html files of the years affected by the changes are regenerated afterwards.
+Current publication lists and status of the service are served over HTTP.
+
+Usage: python service.py [config_file]
+"""
+
+# try to import modules for python3, if failed, fallback to python2
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import heapq
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from io import open
+
+from bibtex_records import BibtexEntries
+from bibtex_records import BibtexRecord
+from bibtex_records import read_bibtex_records
+from configuration import get_citation_file_name
+from configuration import get_optional
+from configuration import read_config
+from parse_bibtex import clean_up_html
+from parse_bibtex import combine_citation_files
+from parse_bibtex import find_duplicate_entries
+from parse_bibtex import group_entries_by_year
+from parse_bibtex import read_citation_file
+from parse_bibtex import remove_nonbibtex_duplicates
+from parse_bibtex import render_bibtex_years
+
+service_section = "service"
+
+
+def format_time(timestamp):
+    """
+    :param timestamp: time in seconds since the epoch or None
+    :return: human readable representation of the time
+    """
+    if timestamp is None:
+        return None
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+def replace_file(source_file, destination_file):
+    """
+    Moves the file, replacing the destination file if there is one
+
+    :param source_file: location of the file
+    :param destination_file: new location of the file
+    """
+    if os.path.exists(destination_file):
+        os.remove(destination_file)
+    shutil.move(source_file, destination_file)
+
+
+def read_file(file_name):
+    """
+    :param file_name: location of the file
+    :return: content of the file as bytes or None if the file does not exist
+    """
+    if not os.path.exists(file_name):
+        return None
+    with open(file_name, "rb") as read_file_handle:
+        return read_file_handle.read()
+
+
+class PublicationService(object):
+    """
+    Keeps configuration, parsed citation files and fingerprints of entries of each year in memory between the refreshes,
+    so that each refresh only needs to query a single person, parse the citation files which have changed
+    and regenerate the years affected by the changes.
+    """
+
+    def __init__(self, config):
+        """
+        :param config: object representing the configuration file specifying parameters of the job
+        """
+        self.config = config
+        self.citations_directory = "citations"
+        self.output_directory = config.get("bibtex", "output_directory")
+
+        # output files are generated here first and then moved to the output directory, so that the current ones
+        # can be served in the meantime
+        self.staging_directory = os.path.join("combined", "staging")
+        self.combined_bibtex_file = os.path.join("combined", "combined_bibtex.bib")
+        self.combined_nonbibtex_file = os.path.join(self.staging_directory, "combined_nonbibtex_citations.txt")
+
+        self.refresh_interval = float(get_optional(config, service_section, "refresh_interval", "3600"))  # in s
+        self.refresh_intervals = json.loads(get_optional(config, service_section, "refresh_intervals", "{}"))
+
+        # heap of (time of the next refresh, source, person, id) tuples
+        self.schedule = list()
+
+        # parsed citation files, by their names; each one is a dict with "stamp" (modification time and size of the file),
+        # "citations" (as returned by parse_bibtex.read_citation_file()) and, once the file is combined,
+        # "unique_bibtex_data" (its part of the combined file) along with "records" and "definitions" of its entries
+        self.citation_files = dict()
+
+        # fingerprints of entries of each year in the last generated output, used to find the years affected by the changes
+        self.year_fingerprints = dict()
+
+        self.output_lock = threading.Lock()  # held while the generated output files are moved to the output directory
+        self.status_lock = threading.Lock()
+        self.status = {"started": format_time(time.time()),
+                       "last_render": None,
+                       "render_error": None,
+                       "rendered_years": list(),
+                       "people": dict()}
+
+    def get_jobs(self):
+        """
+        :return: list of (source, person, id) tuples of all the people whose citations should be refreshed
+        """
+        jobs = list()
+        if self.config.get("orcid", "DO_ORCID") == "True":
+            for keyval in json.loads(self.config.get("orcid", "ids_to_check")):
+                for person, orcid in keyval.items():
+                    jobs.append(("ORCID", person, orcid))
+
+        if self.config.get("pubmed", "DO_PUBMED") == "True":
+            for person in json.loads(self.config.get("pubmed", "people_to_check")):
+                jobs.append(("Pubmed", person, None))
+
+        if self.config.get("gscholar", "DO_GSCHOLAR") == "True":
+            print("[Service] Google Scholar citations are not refreshed by the service (they require a browser), "
+                  "run main.py to update them. Existing ones are still included.")
+
+        return jobs
+
+    def get_refresh_interval(self, person):
+        """
+        :param person: name of the person
+        :return: time (in s) between the refreshes of citations of the person
+        """
+        return float(self.refresh_intervals.get(person, self.refresh_interval))
+
+    def schedule_refresh(self, next_refresh, source, person, identifier):
+        """
+        :param next_refresh: time (in seconds since the epoch) of the next refresh of citations of the person
+        :param source: "ORCID" or "Pubmed"
+        :param person: name of the person
+        :param identifier: orcid of the person (not used for PubMed)
+        """
+        heapq.heappush(self.schedule, (next_refresh, source, person, identifier))
+        with self.status_lock:
+            self.status["people"].setdefault(person + " (" + source + ")", dict())["next_refresh"] = format_time(
+                next_refresh)
+
+    def refresh_person(self, source, person, identifier):
+        """
+        Gets the current citations of the person
+
+        :param source: "ORCID" or "Pubmed"
+        :param person: name of the person
+        :param identifier: orcid of the person (not used for PubMed)
+        :return: True if the citation file of the person has changed, False otherwise
+        """
+        citation_file_name = os.path.join(self.citations_directory, get_citation_file_name(person, source))
+        previous_citations = read_file(citation_file_name)
+
+        error = None
+        try:
+            if source == "ORCID":
+                from orcid import get_orcid_person_citations
+                get_orcid_person_citations(self.config, person, identifier, self.citations_directory)
+            else:
+                from pubmed import get_pubmed_person_citations
+                get_pubmed_person_citations(self.config, person, self.citations_directory)
+        except Exception as e:  # the service should keep running; the person will be retried on the next refresh
+            print("[Service] Could not refresh " + source + " citations of " + person + ": " + str(e))
+            error = str(e)
+
+        with self.status_lock:
+            self.status["people"].setdefault(person + " (" + source + ")", dict()).update({
+                "last_refresh": format_time(time.time()),
+                "error": error})
+
+        return read_file(citation_file_name) != previous_citations
+
+    def read_citation_file(self, citation_file, citations_directory):
+        """
+        Same as parse_bibtex.read_citation_file(), but the citation file is only read again if it has changed
+
+        :param citation_file: name of the citation file
+        :param citations_directory: directory containing the citation files
+        :return: tuple with string with the bibtex citations and list of strings with nonbibtex citations
+        """
+        file_stat = os.stat(os.path.join(citations_directory, citation_file))
+        stamp = (file_stat.st_mtime, file_stat.st_size)
+        if citation_file not in self.citation_files or self.citation_files[citation_file]["stamp"] != stamp:
+            self.citation_files[citation_file] = {"stamp": stamp,
+                                                  "citations": read_citation_file(citation_file, citations_directory),
+                                                  "unique_bibtex_data": None,
+                                                  "records": None,
+                                                  "definitions": None}
+
+        return self.citation_files[citation_file]["citations"]
+
+    def read_combined_entries(self):
+        """
+        Combines the citation files (reading only the changed ones) and reads the entries of the combined file.
+        Entries of a citation file are only scanned again if its part of the combined file has changed,
+        including if any of its citation keys is now suffixed differently
+
+        :return: entries of all the citation files or None if there are no citation files
+        """
+        try:
+            citation_file_ranges = combine_citation_files(self.combined_bibtex_file, self.combined_nonbibtex_file,
+                                                          self.citations_directory, self.read_citation_file)
+        except IOError:
+            return None
+
+        for citation_file in list(self.citation_files):
+            if citation_file not in citation_file_ranges:
+                del self.citation_files[citation_file]
+
+        with open(self.combined_bibtex_file, "rb") as combined_bibtex:
+            bibtex_data = combined_bibtex.read()
+
+        records = list()
+        definitions = list()
+        for citation_file, (start, end) in sorted(citation_file_ranges.items(), key=lambda item: item[1]):
+            parsed_file = self.citation_files[citation_file]
+            if bibtex_data[start:end] != parsed_file["unique_bibtex_data"]:
+                parsed_file["unique_bibtex_data"] = bibtex_data[start:end]
+                parsed_file["definitions"] = list()
+                parsed_file["records"] = read_bibtex_records(parsed_file["unique_bibtex_data"],
+                                                             definitions=parsed_file["definitions"])
+
+            # offsets of the entries are relative to the citation file, they are shifted to the combined file
+            for record in parsed_file["records"]:
+                records.append(BibtexRecord(record.key, record.year, record.title_hash, citation_file,
+                                            record.offset + start, record.length))
+            for (definition_offset, definition_length) in parsed_file["definitions"]:
+                definitions.append((definition_offset + start, definition_length))
+
+        return BibtexEntries(bibtex_data, records, definitions)
+
+    def render(self):
+        """
+        Combines the citation files and regenerates html files of the years whose entries have changed.
+        They are generated in the staging directory, the output directory is only locked while they are moved there
+        """
+        if os.path.exists(self.staging_directory):
+            shutil.rmtree(self.staging_directory)
+        os.makedirs(self.staging_directory)
+
+        bibtex_index = self.read_combined_entries()
+        if bibtex_index is None:
+            print("There are no citations files to combine")
+            return
+
+        remove_nonbibtex_duplicates(self.combined_nonbibtex_file)
+        entries_to_exclude = find_duplicate_entries(bibtex_index.records)
+        with bibtex_index:
+            entries_by_year = group_entries_by_year(bibtex_index.records, entries_to_exclude)
+
+            # year is affected if text of any of its entries (or of the @string entries they may use) has changed
+            definitions = bibtex_index.get_definitions_bytes()
+            year_fingerprints = dict()
+            affected_years = dict()
+            for year, entries in entries_by_year.items():
+                year_fingerprints[year] = hash((definitions, tuple(
+                    bibtex_index.get_entry_bytes(citation_key) for citation_key in sorted(entries))))
+                if year_fingerprints[year] != self.year_fingerprints.get(year):
+                    affected_years[year] = entries
+
+            output_files = render_bibtex_years(affected_years, bibtex_index, self.staging_directory,
+                                               self.config.get("bibtex", "citation_style_file"))
+
+        output_files.append(os.path.basename(self.combined_nonbibtex_file))
+        clean_up_html(self.staging_directory, output_files)
+
+        with self.output_lock:
+            if not os.path.exists(self.output_directory):
+                os.makedirs(self.output_directory)
+
+            for output_file in output_files:
+                replace_file(os.path.join(self.staging_directory, output_file),
+                             os.path.join(self.output_directory, output_file))
+
+            for year in self.year_fingerprints:
+                if year not in year_fingerprints:
+                    output_file = os.path.join(self.output_directory, "output" + year + ".html")
+                    if os.path.exists(output_file):
+                        os.remove(output_file)
+
+        self.year_fingerprints = year_fingerprints
+
+        if affected_years:
+            print("[Service] Regenerated years: " + ", ".join(sorted(affected_years)))
+        with self.status_lock:
+            self.status["last_render"] = format_time(time.time())
+            self.status["rendered_years"] = sorted(affected_years)
+
+    def try_render(self):
+        """
+        Regenerates the output (see render()), errors are reported instead of stopping the service
+
+        :return: True if the output was regenerated, False otherwise
+        """
+        error = None
+        try:
+            self.render()
+        except Exception as e:  # the service should keep running; rendering is retried after the next refresh
+            print("[Service] Could not regenerate the output: " + str(e))
+            error = str(e)
+
+        with self.status_lock:
+            self.status["render_error"] = error
+
+        return error is None
+
+    def get_status(self):
+        """
+        :return: dict describing the current status of the service
+        """
+        with self.status_lock:
+            status = json.loads(json.dumps(self.status))  # deep copy
+        status["years"] = sorted(self.year_fingerprints)
+        return status
+
+    def get_output_file(self, file_name):
+        """
+        :param file_name: name of one of the output files
+        :return: content of the file or None if there is no such file
+        """
+        with self.output_lock:
+            # the server starts before the first output is generated
+            if not os.path.exists(self.output_directory) or file_name not in os.listdir(self.output_directory):
+                return None
+            return read_file(os.path.join(self.output_directory, file_name))
+
+    def get_output_files(self):
+        """
+        :return: names of all the output files
+        """
+        with self.output_lock:
+            if not os.path.exists(self.output_directory):
+                return list()
+            return sorted(os.listdir(self.output_directory))
+
+    def run(self):
+        """
+        Gets citations of everyone and generates all the html files, then keeps refreshing citations of each person
+        once their refresh interval passes. Refreshes of people spread evenly over the interval
+        so that they are not all queried at the same time.
+        """
+        if not os.path.exists(self.citations_directory):
+            os.makedirs(self.citations_directory)
+
+        jobs = self.get_jobs()
+        for (source, person, identifier) in jobs:
+            self.refresh_person(source, person, identifier)
+        is_rendered = self.try_render()
+
+        if not jobs:
+            # nothing to refresh, the existing citation files (e.g. those from Google Scholar) are still served
+            # and checked for changes
+            print("[Service] There are no ORCID or PubMed identifiers to refresh, only the existing citation files "
+                  "are served")
+            while True:
+                time.sleep(self.refresh_interval)
+                self.try_render()
+
+        now = time.time()
+        for idx, (source, person, identifier) in enumerate(jobs):
+            next_refresh = now + self.get_refresh_interval(person) * (idx + 1) / len(jobs)
+            self.schedule_refresh(next_refresh, source, person, identifier)
+
+        while self.schedule:
+            time_to_wait = self.schedule[0][0] - time.time()
+            if time_to_wait > 0:
+                time.sleep(time_to_wait)
+
+            # all the refreshes which are due are done before regenerating the output
+            has_changed = False
+            while self.schedule and self.schedule[0][0] <= time.time():
+                (_, source, person, identifier) = heapq.heappop(self.schedule)
+                if self.refresh_person(source, person, identifier):
+                    has_changed = True
+                self.schedule_refresh(time.time() + self.get_refresh_interval(person), source, person, identifier)
+
+            if has_changed or not is_rendered:
+                is_rendered = self.try_render()
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def make_request_handler(service):
+    """
+    :param service: the running service
+    :return: class handling the HTTP requests to the service
+    """
+
+    class ServiceRequestHandler(BaseHTTPRequestHandler):
+        """
+        Serves:
+        /status - status of the service as JSON
+        /<output file> - one of the generated output files
+        / - list of the generated output files
+        """
+
+        def do_GET(self):
+            path = self.path.split("?")[0].strip("/")
+            if path == "status":
+                self.send_body(json.dumps(service.get_status(), indent=2).encode("utf-8"),
+                               "application/json; charset=utf-8")
+            elif path == "":
+                links = "".join('<li><a href="/%s">%s</a></li>\n' % (output_file, output_file)
+                                for output_file in service.get_output_files())
+                self.send_body(("<ul>\n" + links + "</ul>\n").encode("utf-8"), "text/html; charset=utf-8")
+            else:
+                content = service.get_output_file(os.path.basename(path))
+                if content is None:
+                    self.send_error(404)
+                else:
+                    # clean_up_html() saves the files in that encoding
+                    self.send_body(content, "text/html; charset=ISO-8859-1")
+
+        def send_body(self, body, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # keeps the console output for the refresh progress
+
+    return ServiceRequestHandler
+
+
+def main():
+    config = read_config(sys.argv[1] if len(sys.argv) > 1 else "config.ini")
+    service = PublicationService(config)
+
+    host = get_optional(config, service_section, "host", "127.0.0.1")
+    port = int(get_optional(config, service_section, "port", "8080"))
+    server = ThreadingHTTPServer((host, port), make_request_handler(service))
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    print("[Service] Serving publication lists on http://%s:%d/" % (host, port))
+
+    try:
+        service.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
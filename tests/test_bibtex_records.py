@@ -0,0 +1,115 @@
+"""
+Checks that records read by bibtex_records.read_bibtex_records() agree with entries parsed by pybtex,
+which was used to read the combined bibtex file before
+
+Usage: python -m unittest discover tests
+"""
+
+import random
+import unittest
+
+try:
+    import pybtex.database
+except ImportError:
+    pybtex = None
+
+from bibtex_records import normalize_title
+from bibtex_records import read_bibtex_records
+
+
+def read_with_pybtex(bibtex_data):
+    """
+    :param bibtex_data: string with bibtex citations
+    :return: list of (citation key, year, title hash) tuples, the same way read_bibtex_records() describes the entries
+    """
+    entries = list()
+    for citation_key, entry in pybtex.database.parse_string(bibtex_data, "bibtex").entries.items():
+        year = entry.fields.get("year", "").strip() or "none"
+        title_hash = hash(normalize_title(entry.fields["title"])) if "title" in entry.fields else None
+        entries.append((citation_key, year, title_hash))
+    return entries
+
+
+def read_with_records(bibtex_data):
+    """
+    :param bibtex_data: string with bibtex citations
+    :return: list of (citation key, year, title hash) tuples of the records
+    """
+    return [(record.key, record.year, record.title_hash) for record in
+            read_bibtex_records(bibtex_data.encode("utf-8"))]
+
+
+@unittest.skipIf(pybtex is None, "pybtex is not installed")
+class ReadBibtexRecordsTest(unittest.TestCase):
+
+    def assert_same_as_pybtex(self, bibtex_data):
+        self.assertEqual(read_with_records(bibtex_data), read_with_pybtex(bibtex_data))
+
+    def test_string_macros_with_concatenation(self):
+        self.assert_same_as_pybtex('@string{jn = "Journal"}\n'
+                                   '@string(pre = "A study" # " of")\n'
+                                   '@article{Concat2001,\n'
+                                   '  title = pre # " {T}ests in " # jn,\n'
+                                   '  journal = jn # " of Tests",\n'
+                                   '  year = 2001\n'
+                                   '}\n')
+
+    def test_parenthesised_entries(self):
+        self.assert_same_as_pybtex('@article(Paren2002, title = {Parenthesised (entry)}, year = {2002})\n'
+                                   '@ARTICLE( Paren2003 ,\n  Title = "Quoted (entry)",\n  YEAR = 2003\n)\n')
+
+    def test_comments(self):
+        self.assert_same_as_pybtex('@comment{Nothing to read here}\n'
+                                   '@comment{Commented @article{Inner1999, title = {Inner}, year = 1999}}\n'
+                                   '@article{Outer2000, title = {Outer}, year = 2000}\n'
+                                   'Text outside of entries is ignored as well\n')
+
+    def test_bare_month_macros(self):
+        self.assert_same_as_pybtex('@article{Month2003, month = jan, title = {Monthly}, year = "2003"}\n'
+                                   '@article{Month2004, title = {Also Monthly}, month = dec # "~1", year = 2004}\n')
+
+    def test_doubled_braces_in_titles(self):
+        self.assert_same_as_pybtex('@article{Braces2005, title = {{Doubled Braces}}, year = 2005}\n'
+                                   '@article{Braces2006, title = "{{Quoted}} and {Braced}", year = 2006}\n'
+                                   '@article{Braces2007, title = {  {Extra \n   Whitespace}  }, year = 2007}\n')
+
+    def test_empty_year(self):
+        self.assert_same_as_pybtex('@article{EmptyYear, title = {Empty}, year = {}}\n'
+                                   '@article{NoYear, title = {Missing}}\n'
+                                   '@article{NoTitle, year = 2008}\n')
+
+    def test_synthetic_corpus(self):
+        rng = random.Random(2017)
+        titles = ["{Title %d}", "{{Title %d}}", '"Title %d"', 'jn # " %d"', "{Title\n   %d}", '"{T}itle" # " %d"']
+        years = ["{%d}", "%d", '"%d"', "{}", None]
+        bibtex_data = '@string{jn = "Journal"}\n@comment{generated entries}\n'
+        for idx in range(500):
+            year = rng.choice(years)
+            (opening, closing) = rng.choice([("{", "}"), ("(", ")")])
+            fields = ["title = " + rng.choice(titles) % rng.randint(0, 100)]
+            if year is not None:
+                fields.append("year = " + (year % rng.randint(1990, 2017) if "%d" in year else year))
+            if rng.random() < 0.5:
+                fields.append("month = " + rng.choice(["jan", "{feb}", '"mar"']))
+            rng.shuffle(fields)
+            bibtex_data += "@%s%sKey%d,\n  %s\n%s\n\n" % (rng.choice(["article", "ARTICLE", "inproceedings"]), opening,
+                                                        idx, ",\n  ".join(fields), closing)
+
+        self.assert_same_as_pybtex(bibtex_data)
+
+    def test_entry_slices(self):
+        bibtex_data = ('@string{jn = "Journal"}\n'
+                       '@article{Slice2009, title = {Sliced {Title}}, journal = jn, year = 2009}\n\n'
+                       '@book(Slice2010, title = {Book}, year = 2010)\n').encode("utf-8")
+        definitions = list()
+        records = read_bibtex_records(bibtex_data, definitions=definitions)
+
+        self.assertEqual([bibtex_data[offset:offset + length] for (offset, length) in definitions],
+                         [b'@string{jn = "Journal"}'])
+        self.assertEqual([bibtex_data[record.offset:record.offset + record.length] for record in records],
+                         [b'@article{Slice2009, title = {Sliced {Title}}, journal = jn, year = 2009}',
+                          b'@book(Slice2010, title = {Book}, year = 2010)'])
+
+
+if __name__ == '__main__':
+    unittest.main()
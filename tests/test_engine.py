@@ -0,0 +1,181 @@
+"""
+Checks that engine.get_citations() combines the citation files the same way parse_bibtex.combine_citation_files() does
+regardless of the order the queries finish in, and that a failing source does not stop the other ones
+
+Usage: python -m unittest discover tests
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    mock = None
+
+from configuration import read_config
+from parse_bibtex import combine_citation_files
+from parse_bibtex import remove_bibtex_duplicates
+
+try:
+    import engine
+except SyntaxError:  # the engine requires python 3.5+
+    engine = None
+
+config_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.ini")
+
+people = ["Lorem Ipsum", "Dolor Sit"]
+
+
+def write_citation_file(citations_directory, person, source):
+    """
+    Saves the same entry (with a note saying where it came from) to the person's citation file
+
+    :param citations_directory: directory in which the citation files are saved
+    :param person: name of the person
+    :param source: source of the citations, i.e. "ORCID", "Pubmed" or "GSCHOLAR"
+    """
+    with open(os.path.join(citations_directory, engine.get_citation_file_name(person, source)), "w") as citation_file:
+        citation_file.write("@article{Key,\n title = {Same Paper},\n year = {2017},\n note = {%s %s}\n}\n\n"
+                            % (source, person))
+
+
+def make_source_modules(delays, failing=()):
+    """
+    :param delays: dict with time (in s) each query of the given source takes
+    :param failing: (source, person) tuples of the queries which fail
+    :return: dict with fake orcid and pubmed modules
+    """
+    def query(source, person, citations_directory):
+        time.sleep(delays[source])
+        if (source, person) in failing:
+            raise IOError("HTTP Error 429")
+        write_citation_file(citations_directory, person, source)
+
+    orcid = types.ModuleType("orcid")
+    orcid.get_orcid_person_citations = lambda config, person, orcid_id, citations_directory: \
+        query("ORCID", person, citations_directory) or 0
+    orcid.print_unspecified_format_summary = lambda unspecified_format: None
+
+    pubmed = types.ModuleType("pubmed")
+    pubmed.get_pubmed_person_citations = lambda config, person, citations_directory: \
+        query("Pubmed", person, citations_directory)
+
+    return {"orcid": orcid, "pubmed": pubmed}
+
+
+@unittest.skipIf(engine is None or mock is None, "the engine requires python 3.5+")
+class TestGetCitations(unittest.TestCase):
+    def setUp(self):
+        self.previous_directory = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        os.makedirs("citations")
+
+        self.config = read_config(config_file)
+        self.config.set("orcid", "ids_to_check", json.dumps([{person: "1234-5678-9012-3456"} for person in people]))
+        self.config.set("pubmed", "people_to_check", json.dumps(people))
+        self.config.set("gscholar", "DO_GSCHOLAR", "False")
+        self.config.set("bibtex", "PARSE_OUTPUT", "True")
+        self.config.set("bibtex", "output_directory", "output")
+        for source in ("orcid", "pubmed"):
+            self.config.set("engine", source + "_rate", "0")
+
+    def tearDown(self):
+        os.chdir(self.previous_directory)
+        shutil.rmtree(self.directory)
+
+    def get_citations(self, source_modules):
+        """
+        Runs the engine with the given source modules, without rendering the output
+
+        :param source_modules: dict with the modules replacing the real ones
+        :return: content of the combined bibtex file the engine generated
+        """
+        rendered = list()
+
+        def render_combined_files(config, combined_bibtex_file, combined_nonbibtex_file):
+            with open(combined_bibtex_file) as combined_bibtex:
+                rendered.append(combined_bibtex.read())
+
+        with mock.patch.dict(sys.modules, source_modules):
+            with mock.patch.object(engine, "render_combined_files", render_combined_files):
+                engine.get_citations(self.config)
+
+        self.assertEqual(len(rendered), 1)
+        return rendered[0]
+
+    def assert_combined_in_order(self, combined_bibtex):
+        """
+        Checks the combined file is the same as the one combine_citation_files() generates
+        and that the ORCID entry is the one kept of the duplicates
+
+        :param combined_bibtex: content of the combined bibtex file the engine generated
+        """
+        combine_citation_files(os.path.join("combined", "reference.bib"), os.path.join("output", "reference.txt"))
+        with open(os.path.join("combined", "reference.bib")) as reference_bibtex:
+            self.assertEqual(combined_bibtex, reference_bibtex.read())
+
+        (entries_to_exclude, bibtex_index) = remove_bibtex_duplicates(os.path.join("combined", "reference.bib"))
+        with bibtex_index:
+            kept_entries = [bibtex_index.get_entry_bytes(record.key) for record in bibtex_index.records
+                            if record.key not in entries_to_exclude]
+        self.assertEqual(len(kept_entries), 1)
+        self.assertIn(b"note = {ORCID ", kept_entries[0])
+
+    def test_slow_orcid(self):
+        combined_bibtex = self.get_citations(make_source_modules({"ORCID": 0.1, "Pubmed": 0.0}))
+        self.assert_combined_in_order(combined_bibtex)
+
+    def test_slow_pubmed(self):
+        combined_bibtex = self.get_citations(make_source_modules({"ORCID": 0.0, "Pubmed": 0.1}))
+        self.assert_combined_in_order(combined_bibtex)
+
+    def test_failing_person(self):
+        # the citations from the previous run are combined in their place
+        write_citation_file("citations", "Dolor Sit", "Pubmed")
+        combined_bibtex = self.get_citations(make_source_modules({"ORCID": 0.1, "Pubmed": 0.0},
+                                                                 failing=[("Pubmed", "Dolor Sit")]))
+        self.assertIn("note = {Pubmed Dolor Sit}", combined_bibtex)
+        self.assert_combined_in_order(combined_bibtex)
+
+    def test_scholar_not_available(self):
+        # Google Scholar citations from the previous run are still combined, even if the browser cannot be used
+        self.config.set("gscholar", "DO_GSCHOLAR", "True")
+        self.config.set("gscholar", "scholar_ids", json.dumps([{people[0]: "ABCDEFGHIJK"}]))
+        write_citation_file("citations", people[0], "GSCHOLAR")
+
+        source_modules = make_source_modules({"ORCID": 0.1, "Pubmed": 0.0})
+        source_modules["gscholar"] = None  # import fails, as if selenium was not installed
+        combined_bibtex = self.get_citations(source_modules)
+        self.assertIn("note = {GSCHOLAR Lorem Ipsum}", combined_bibtex)
+        self.assert_combined_in_order(combined_bibtex)
+
+    def test_scholar_browser_not_closed(self):
+        self.config.set("gscholar", "DO_GSCHOLAR", "True")
+        self.config.set("gscholar", "scholar_ids", json.dumps([{people[0]: "ABCDEFGHIJK"}]))
+
+        def close():
+            raise IOError("browser is gone")
+
+        gscholar = types.ModuleType("gscholar")
+        gscholar.open_browser = lambda config: types.SimpleNamespace(close=close)
+        gscholar.get_gscholar_person_citations = \
+            lambda config, browser_driver, person, scholar_id, citations_directory: \
+            write_citation_file(citations_directory, person, "GSCHOLAR")
+
+        source_modules = make_source_modules({"ORCID": 0.0, "Pubmed": 0.1})
+        source_modules["gscholar"] = gscholar
+        combined_bibtex = self.get_citations(source_modules)
+        self.assertIn("note = {GSCHOLAR Lorem Ipsum}", combined_bibtex)
+        self.assert_combined_in_order(combined_bibtex)
+
+
+if __name__ == '__main__':
+    unittest.main()